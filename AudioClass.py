@@ -1,17 +1,22 @@
 import threading
-import queue
 import time
 import numpy as np
 from dataclasses import dataclass
 import librosa
 import filter as flt
+from AudioRing import BlockRing
+from Latency import tracer
+from Metrics import registry
 from RealtimeNMF import DecomposeNMF
+from Runtime import Runtime
 import pyaudio
 import sys
 import datetime
 
 
 class AudioSource:
+    capture_time = 0.0  # time.monotonic() zachycení posledního přečteného bloku
+
     def read_buffer(self):
         raise NotImplementedError("Method read_buffer() must be implemented.")
 
@@ -34,6 +39,7 @@ class MicrophoneSource(AudioSource):
 
     def read_buffer(self):
         buffer_data = self.stream.read(self.FRAMES_PER_BUFFER)
+        self.capture_time = time.monotonic() - self.stream.get_input_latency()
         return np.frombuffer(buffer_data, dtype=np.int16)
 
     def cleanup(self):
@@ -43,7 +49,6 @@ class MicrophoneSource(AudioSource):
 
 
 import threading
-import queue
 import time
 import numpy as np
 import librosa
@@ -58,52 +63,54 @@ class FileSource(AudioSource):
         self.hop = hop or self.buffer_size
         self.pointer = 0
 
-        self.audio_queue = queue.Queue(maxsize=100)
-        self.analysis_queue = queue.Queue(maxsize=100)
+        self.ring = BlockRing()
+        self.reader = self.ring.reader("analysis")
+        registry.counter("audio_source_dropped_total", "Bloky přepsané dřív, než je analýza přečetla",
+                         fn=lambda: self.reader.overruns, source="file")
 
+        # Přehrávání běží v callbacku PortAudio – žádné vlastní vlákno
+        self.stop_event = threading.Event()
+        self.output_latency = 0.0  # do otevření streamu (callback může přijít dřív)
         self.p = pyaudio.PyAudio()
         self.output_stream = self.p.open(
             format=pyaudio.paInt16,
             channels=1,
             rate=self.rate,
             output=True,
-            frames_per_buffer=self.buffer_size
+            frames_per_buffer=self.buffer_size,
+            stream_callback=self.playback_callback
         )
+        self.output_latency = self.output_stream.get_output_latency()
 
-        self.stop_event = threading.Event()
-        self.playback_thread = threading.Thread(target=self.playback_loop, daemon=True)
-        self.playback_thread.start()
-
-    def playback_loop(self):
-        while not self.stop_event.is_set():
-            if self.pointer + self.buffer_size >= len(self.signal):
-                self.stop_event.set()
-                break
-
-            # Vyříznout frame, posunout ukazatel
-            frame = self.signal[self.pointer:self.pointer + self.buffer_size]
-            self.pointer += self.hop
-            frame_int16 = np.int16(frame * 32767)
-            data_bytes = frame_int16.tobytes()
-
-            # Přehrát
-            self.output_stream.write(data_bytes)
-
-            # Poslat do fronty pro analýzu
-            try:
-                self.analysis_queue.put(frame_int16, timeout=0.1)
-            except queue.Full:
-                pass  # Analýza nestíhá – přeskoč
+    def playback_callback(self, in_data, frame_count, time_info, status):
+        if self.stop_event.is_set() or self.pointer + self.buffer_size >= len(self.signal):
+            self.stop_event.set()
+            return b"", pyaudio.paComplete
+
+        # Vyříznout frame, posunout ukazatel
+        frame = self.signal[self.pointer:self.pointer + self.buffer_size]
+        self.pointer += self.hop
+        frame_int16 = np.int16(frame * 32767)
+
+        # Poslat k analýze – zápis do kruhu nikdy neblokuje přehrávání; do místnosti
+        # blok zazní až po výstupní latenci (protějšek vstupní latence mikrofonu)
+        self.ring.write(frame_int16, time.monotonic() + self.output_latency)
+
+        # Přehrát
+        return frame_int16.tobytes(), pyaudio.paContinue
+
+    @property
+    def finished(self):
+        return self.stop_event.is_set() and self.reader.pending == 0
 
     def read_buffer(self):
-        try:
-            return self.analysis_queue.get(timeout=0.1)
-        except queue.Empty:
-            return None  # Není k dispozici – asi konec
+        # Vše nepřečtené od posledního čtení najednou, aby analýza nezaostávala
+        buffer = self.reader.drain()
+        self.capture_time = self.reader.capture_time
+        return buffer
 
     def cleanup(self):
         self.stop_event.set()
-        self.playback_thread.join()
         self.output_stream.stop_stream()
         self.output_stream.close()
         self.p.terminate()
@@ -117,19 +124,29 @@ class AudioState:
     db: float = -np.inf
     bpm: int = 0
     beat_on_off: bool = False
+    beat_time: float = 0.0  # time.monotonic() posledního beatu (fáze pro sekvencer)
     freqs: tuple = (0, 0, 0)
     chord: str = ""
+    capture_time: float = 0.0  # time.monotonic() zachycení audia, ze kterého je poslední změna
 
 
 class AudioPipeline:
-    def __init__(self, source, rate=44100):
+    """
+    Analýza audia jako úlohy Runtime: čtení bloků ze zdroje, beat
+    (plánuje se na očekávaný čas dalšího beatu), frekvence/akordy
+    a tempo. Těžké kroky běží v poolu runtime, stop() úlohy zruší
+    a počká na jejich doběhnutí.
+    """
+    def __init__(self, source, rate=44100, runtime=None):
         self.source = source
+        self.runtime = runtime
         self.rate = rate
         self.buffer_size = rate // 10
 
-        self.buffer_queue = queue.Queue(maxsize=20)
+        # Bloky ze zdroje pro všechny analyzátory; beat čte vždy ten nejčerstvější
+        self.ring = BlockRing(capacity=64)
+        self.beat_reader = self.ring.reader("beat")
         self.signal_store = []
-        self.recent_signal = np.array([], dtype=np.int16)
         self.state = AudioState()
 
         self.max_amplitude = 32767
@@ -144,6 +161,29 @@ class AudioPipeline:
 
         self.nmf_analyzer = DecomposeNMF(sr=self.rate, n_components=5, n_fft=4096)
 
+        self.m_blocks = registry.counter("audio_blocks_total", "Bloky převzaté ze zdroje")
+        self.m_beats = registry.counter("audio_beats_total", "Vyhlášené beaty")
+        self.m_detected = registry.counter("audio_beats_detected_total", "Beaty potvrzené detekcí onsetu")
+        self.m_beat_seconds = registry.histogram("audio_beat_adjustment_seconds", "Doba beat_adjustment")
+        self.m_bpm_seconds = registry.histogram("audio_bpm_seconds", "Doba calculate_bpm")
+        registry.counter("audio_ring_skipped_total", "Bloky, které beat analýza přeskočila kvůli čerstvějším",
+                         fn=lambda: self.beat_reader.skipped, reader="beat")
+        registry.gauge("audio_bpm", "Aktuální tempo", fn=lambda: self.state.bpm)
+        registry.gauge("audio_level_db", "Úroveň posledního bloku", fn=lambda: self.state.db)
+
+        self.tasks = []
+        self._input_task = None
+        self._beat_task = None
+        self._beat_off_task = None
+
+    def recent(self, samples):
+        """Posledních `samples` vzorků vstupu."""
+        return self.ring.window(samples)
+
+    @property
+    def recent_signal(self):
+        return self.recent(self.max_recent_signal_length)
+
     def filter(self, signal, filter_type='HP', f1=200, f2=None, Q=4):
         return flt.create_filter(signal, filter_type, self.rate, f1, f2, Q)
 
@@ -175,7 +215,7 @@ class AudioPipeline:
         return len(peaks) > 0
 
     def calculate_bpm(self):
-        y = self.recent_signal.astype(np.float32) / self.max_amplitude
+        y = self.recent(self.rate * 4).astype(np.float32) / self.max_amplitude
         if len(y) >= self.rate * 4:
             tempo, _ = librosa.beat.beat_track(y=y, sr=self.rate)
             bpm = float(tempo[0]) if isinstance(tempo, (np.ndarray, list)) else float(tempo)
@@ -185,96 +225,119 @@ class AudioPipeline:
                 self.state.bpm = round(bpm)
             self.bpm_ready_event.set()
 
-    def input_loop(self):
-        while len(self.recent_signal) < self.rate * 4 and not self.stop_event.is_set():
-            buffer = self.source.read_buffer()
-            if buffer is None:
-                break
-            self.recent_signal = np.concatenate((self.recent_signal, buffer))
-            time.sleep(self.buffer_size / self.rate)
-
-        while not self.stop_event.is_set():
-            buffer = self.source.read_buffer()
-            if buffer is None:
-                break
-            try:
-                self.buffer_queue.put(buffer, timeout=0.5)
-                self.recent_signal = np.concatenate((self.recent_signal, buffer))
-                if len(self.recent_signal) > self.max_recent_signal_length:
-                    self.recent_signal = self.recent_signal[-self.max_recent_signal_length:]
-            except queue.Full:
-                continue
-            time.sleep(self.buffer_size / self.rate)
-
-    def beat_analysis_loop(self):
-        self.bpm_ready_event.wait()
-        self.last_beat_time = time.time()
+    def _schedule_beat(self, delay):
+        with self.lock:
+            if not self.stop_event.is_set():
+                # Krok beatu (filtr a onset detekce) musí přijít včas, ale nesmí
+                # zdržet DMX snímky ve vlákně plánovače – má vlastní worker,
+                # takže nečeká ve frontě poolu za čtením audia, NMF a librosou
+                self._beat_task = self.runtime.after(delay, self.beat_tick, name="beat", worker="beat")
+
+    def _input_tick(self):
+        buffer = self.source.read_buffer()
+        if buffer is None:
+            if getattr(self.source, "finished", False):
+                self.runtime.cancel(self._input_task, wait=False)
+            return
+        capture_time = self.source.capture_time or time.monotonic()
+        self.ring.write(buffer, capture_time)
+        self.m_blocks.inc()
+        tracer.since("source", capture_time)
+
+    def beat_tick(self):
+        # Jeden krok beat analýzy; naplánuje se znovu na další očekávaný beat
+        now = time.time()
+        with self.lock:
+            bpm = self.state.bpm
+        if bpm <= 0:
+            self._schedule_beat(0.01)
+            return
 
-        while not self.stop_event.is_set():
-            now = time.time()
-            with self.lock:
-                bpm = self.state.bpm
-
-            beat_interval = 60.0 / bpm if bpm > 0 else None
-            if beat_interval is None:
-                time.sleep(0.01)
-                continue
-
-            next_beat_time = self.last_beat_time + beat_interval
-            time.sleep(max(0, next_beat_time - now))
-            now = time.time()
-
-            buffer = None
-            try:
-                buffer = self.buffer_queue.get_nowait()
-                self.calculate_rms(buffer)
-            except queue.Empty:
-                pass
-
-            beat_detected = buffer is not None and abs(now - next_beat_time) <= 0.2 and self.beat_adjustment(buffer)
-            if beat_detected:
-                self.last_beat_time = now
-            else:
-                self.last_beat_time = next_beat_time
+        beat_interval = 60.0 / bpm
+        next_beat_time = self.last_beat_time + beat_interval
+        if next_beat_time - now > 0.002:
+            self._schedule_beat(next_beat_time - now)
+            return
 
-            with self.lock:
-                self.state.beat_on_off = True
-                self.beat_count += 1
+        buffer = self.beat_reader.latest()
+        capture_time = self.beat_reader.capture_time if buffer is not None else 0.0
+        self.advance_beat(now, next_beat_time, buffer)
 
-            time.sleep(0.15)
+        with self.lock:
+            self.state.beat_on_off = True
+            self.state.beat_time = time.monotonic() - (time.time() - self.last_beat_time)
+            self.beat_count += 1
+            self.m_beats.inc()
+            if capture_time:
+                self.state.capture_time = capture_time
+            if not self.stop_event.is_set():
+                self._beat_off_task = self.runtime.after(0.15, self._beat_off, name="beat_off")
+        tracer.since("beat", capture_time)
+        self._schedule_beat(self.last_beat_time + beat_interval - time.time())
+
+    def advance_beat(self, now, next_beat_time, buffer):
+        """
+        Rozhodne o beatu očekávaném v `next_beat_time` podle posledního
+        bloku: potvrzený onset posune fázi na `now`, jinak beat zůstane
+        na mřížce tempa. Vrací čas beatu (nový last_beat_time).
+        """
+        beat_detected = False
+        if buffer is not None:
+            self.calculate_rms(buffer)
+            if abs(now - next_beat_time) <= 0.2:
+                with self.m_beat_seconds.time():
+                    beat_detected = self.beat_adjustment(buffer)
+        if beat_detected:
+            self.m_detected.inc()
+        self.last_beat_time = now if beat_detected else next_beat_time
+        return self.last_beat_time
+
+    def _beat_off(self):
+        with self.lock:
+            self.state.beat_on_off = False
+
+    def frequency_tick(self):
+        capture_time = self.ring.stamp(self.ring.written - 1)
+        data = self.recent(self.rate)
+        if len(data) >= self.rate:
+            notes = self.nmf_analyzer.analyze_buffer(data)
             with self.lock:
-                self.state.beat_on_off = False
-
-    def frequency_analysis_loop(self):
-        while not self.stop_event.is_set():
-            time.sleep(1.0)
-            if len(self.recent_signal) >= self.rate:
-                data = self.recent_signal[-self.rate:]
-                notes = self.nmf_analyzer.analyze_buffer(data)
-                with self.lock:
-                    if len(notes) >= 3:
-                        self.state.freqs = tuple(notes[:3])
-                        self.state.chord = str(notes[-1])
-
-    def bpm_analysis_loop(self):
-        while not self.stop_event.is_set():
-            time.sleep(2.0)
+                if len(notes) >= 3:
+                    self.state.freqs = tuple(notes[:3])
+                    self.state.chord = str(notes[-1])
+                    self.state.capture_time = capture_time
+            tracer.since("nmf", capture_time)
+
+    def bpm_tick(self):
+        with self.m_bpm_seconds.time():
             self.calculate_bpm()
+        # Beat analýza startuje s prvním odhadem tempa
+        if self.bpm_ready_event.is_set() and self._beat_task is None:
+            self.last_beat_time = time.time()
+            self._schedule_beat(0)
 
     def start(self):
-        self.threads = [
-            threading.Thread(target=self.input_loop),
-            threading.Thread(target=self.beat_analysis_loop),
-            threading.Thread(target=self.frequency_analysis_loop),
-            threading.Thread(target=self.bpm_analysis_loop),
+        self.runtime = self.runtime or Runtime.shared()
+        self.stop_event.clear()
+        period = self.buffer_size / self.rate
+        self._input_task = self.runtime.every(period, self._input_tick, name="audio_input", blocking=True)
+        self.tasks = [
+            self._input_task,
+            # Fáze posunuté o půl sekundy, aby NMF a librosa nezabíraly workery ve stejnou chvíli
+            self.runtime.every(1.0, self.frequency_tick, name="frequency", blocking=True, delay=1.0),
+            self.runtime.every(2.0, self.bpm_tick, name="bpm", blocking=True, delay=2.5),
         ]
-        for t in self.threads:
-            t.start()
 
     def stop(self):
-        self.stop_event.set()
-        for t in self.threads:
-            t.join()
+        with self.lock:
+            self.stop_event.set()
+            tasks = self.tasks + [self._beat_task, self._beat_off_task]
+        for task in tasks:
+            self.runtime.cancel(task)
+        self.tasks = []
+        self._beat_task = self._beat_off_task = None
+        with self.lock:
+            self.state.beat_on_off = False
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import time
+import numpy as np
+
+
+class BlockRing:
+    """
+    Kruhový buffer audio bloků: jeden zapisovatel, libovolně čtenářů.
+
+    Zapisovatel uloží blok do slotu a teprve potom zvýší `written`
+    (pořadové číslo dalšího bloku); čtenáři mají vlastní kurzory a nic
+    nezamykají – přiřazení do seznamu a čísla je pod GIL atomické
+    a bloky se po zápisu nemění. Pomalý čtenář zápis nikdy nebrzdí:
+    když ho zapisovatel předběhne o celý kruh, přeskočí ztracené bloky
+    a započítá je do `overruns`.
+
+    Ke každému bloku se ukládá čas zachycení (time.monotonic()); čtenář
+    ho po čtení vrací v `capture_time` (u spojených bloků ten nejstarší).
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.stamps = [0.0] * capacity
+        self.written = 0
+        self.samples_written = 0
+
+    def write(self, block, capture_time=None):
+        slot = self.written % self.capacity
+        self.slots[slot] = block
+        self.stamps[slot] = time.monotonic() if capture_time is None else capture_time
+        self.samples_written += len(block)
+        self.written += 1
+        return self.written - 1
+
+    def reader(self, name=None, latest=True):
+        """Nový čtenář; s `latest` začíná od aktuálního konce (bez historie)."""
+        return RingReader(self, name, self.written if latest else 0)
+
+    def get(self, seq):
+        """Blok s pořadovým číslem `seq`, nebo None, pokud už byl přepsán."""
+        block = self.slots[seq % self.capacity]
+        # Slot bloku seq + capacity se může právě přepisovat – kruh drží capacity - 1 bloků
+        if self.written - seq >= self.capacity:
+            return None
+        return block
+
+    def stamp(self, seq):
+        return self.stamps[seq % self.capacity]
+
+    def window(self, samples):
+        """Posledních `samples` vzorků (méně, pokud ještě nejsou zapsané)."""
+        end = self.written
+        blocks, total = [], 0
+        seq = end - 1
+        while total < samples and seq >= max(0, end - self.capacity + 1):
+            block = self.get(seq)
+            if block is None:
+                break
+            blocks.append(block)
+            total += len(block)
+            seq -= 1
+        if not blocks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(blocks[::-1])[-samples:]
+
+
+class RingReader:
+    """Kurzor jednoho analyzátoru nad BlockRing."""
+    __slots__ = ("ring", "name", "cursor", "overruns", "skipped", "capture_time")
+
+    def __init__(self, ring, name, cursor):
+        self.ring = ring
+        self.name = name
+        self.cursor = cursor
+        self.overruns = 0   # bloky přepsané dřív, než je čtenář stihl přečíst
+        self.skipped = 0    # bloky vynechané schválně kvůli čerstvějšímu (latest)
+        self.capture_time = 0.0
+
+    @property
+    def pending(self):
+        return min(self.ring.written - self.cursor, self.ring.capacity - 1)
+
+    def _catch_up(self):
+        lost = self.ring.written - self.cursor - self.ring.capacity + 1
+        if lost > 0:
+            self.overruns += lost
+            self.cursor += lost
+
+    def read(self):
+        """Další nepřečtený blok v pořadí, nebo None."""
+        self._catch_up()
+        if self.cursor >= self.ring.written:
+            return None
+        block = self.ring.get(self.cursor)
+        if block is None:
+            self._catch_up()
+            return self.read()
+        self.capture_time = self.ring.stamp(self.cursor)
+        self.cursor += 1
+        return block
+
+    def latest(self):
+        """Nejčerstvější nepřečtený blok (starší se přeskočí), nebo None."""
+        end = self.ring.written
+        if self.cursor >= end:
+            return None
+        self.skipped += end - 1 - self.cursor
+        self.cursor = end
+        self.capture_time = self.ring.stamp(end - 1)
+        return self.ring.get(end - 1)
+
+    def drain(self):
+        """Všechny nepřečtené bloky spojené do jednoho, nebo None."""
+        blocks = []
+        block = self.read()
+        first = self.capture_time
+        while block is not None:
+            blocks.append(block)
+            block = self.read()
+        if not blocks:
+            return None
+        self.capture_time = first
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
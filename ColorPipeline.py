@@ -0,0 +1,124 @@
+import numpy as np
+
+
+COLOR_PARAMS = ("r", "g", "b", "w", "uv")
+
+# Jak se barva (r, g, b, w, uv) promítne do kanálů světla, kterému W/UV chybí:
+# bílá se rozloží do RGB, UV se přiblíží fialovou (modrá + půl červené).
+_FOLD_MISSING_W = {"r": 1.0, "g": 1.0, "b": 1.0}
+_FOLD_MISSING_UV = {"r": 0.5, "b": 1.0}
+
+
+def curve_lut(curve="linear", gamma=2.2):
+    """Tabulka 256 hodnot pro křivku stmívače (linear, square, gamma)."""
+    x = np.arange(256) / 255.0
+    if curve == "linear":
+        y = x
+    elif curve == "square":
+        y = x * x
+    elif curve == "gamma":
+        y = x ** gamma
+    else:
+        raise ValueError(f"Neznámá křivka stmívače '{curve}'.")
+    return np.rint(y * 255).astype(np.uint8)
+
+
+def gain_lut(gain):
+    return np.rint(np.clip(np.arange(256) * gain, 0, 255)).astype(np.uint8)
+
+
+def compose(first, second):
+    """Tabulka, která odpovídá použití `first` a potom `second`."""
+    return second[first]
+
+
+def color_weights(params_present):
+    """
+    Matice (kanál x 5) pro převod barvy (r, g, b, w, uv) na barevné kanály
+    jednoho světla. `params_present` je seznam barevných parametrů světla.
+    """
+    rows = []
+    for param in params_present:
+        row = np.zeros(len(COLOR_PARAMS))
+        row[COLOR_PARAMS.index(param)] = 1.0
+        if "w" not in params_present:
+            row[3] = _FOLD_MISSING_W.get(param, 0.0)
+        if "uv" not in params_present:
+            row[4] = _FOLD_MISSING_UV.get(param, 0.0)
+        rows.append(row)
+    return np.array(rows).reshape(-1, len(COLOR_PARAMS))
+
+
+def compile_profile(profile):
+    """
+    Tabulky výstupní korekce profilu: parametr -> LUT. Barevné kanály
+    dostanou zesílení bílého bodu, stmívač křivku; světla bez stmívače
+    mají křivku na barevných kanálech.
+    """
+    luts = {}
+    curve = curve_lut(profile.dimmer_curve, profile.gamma)
+    has_dim = "dim" in profile.channels
+    if has_dim and profile.dimmer_curve != "linear":
+        luts["dim"] = curve
+    gains = dict(zip(("r", "g", "b"), profile.white_point or (1.0, 1.0, 1.0)))
+    for param in COLOR_PARAMS:
+        if param not in profile.channels:
+            continue
+        lut = gain_lut(gains.get(param, 1.0))
+        if not has_dim:
+            lut = compose(lut, curve)
+        if not np.array_equal(lut, np.arange(256)):
+            luts[param] = lut
+    return luts
+
+
+class OutputCorrection:
+    """
+    Korekce výstupního snímku: převod RGB -> RGBW a tabulky (bílý bod,
+    křivky stmívačů). Každý kanál má číslo tabulky (0 = beze změny), takže
+    celá korekce je jeden vektorový převod přes `luts[id, hodnota]`.
+    """
+    def __init__(self, size):
+        self.luts = np.arange(256, dtype=np.uint8)[None, :].copy()
+        self._lut_ids = {self.luts[0].tobytes(): 0}
+        self.lut_index = np.zeros(size, dtype=np.intp)
+        self.channels = np.zeros(0, dtype=np.intp)
+        self.rgbw = np.zeros((0, 4), dtype=np.intp)  # řádky r, g, b, w
+
+    def resize(self, size):
+        if size > len(self.lut_index):
+            grown = np.zeros(size, dtype=np.intp)
+            grown[:len(self.lut_index)] = self.lut_index
+            self.lut_index = grown
+
+    def lut_id(self, lut):
+        key = np.asarray(lut, dtype=np.uint8).tobytes()
+        index = self._lut_ids.get(key)
+        if index is None:
+            index = self._lut_ids[key] = len(self.luts)
+            self.luts = np.vstack([self.luts, np.frombuffer(key, dtype=np.uint8)])
+        return index
+
+    def set_lut(self, channels, lut):
+        self.lut_index[channels] = self.lut_id(lut)
+        self.channels = np.flatnonzero(self.lut_index)
+
+    def add_rgbw(self, r, g, b, w):
+        self.rgbw = np.vstack([self.rgbw, [[r, g, b, w]]])
+
+    def remove(self, channels):
+        channels = np.asarray(channels, dtype=np.intp)
+        self.lut_index[channels] = 0
+        self.channels = np.flatnonzero(self.lut_index)
+        if len(self.rgbw):
+            self.rgbw = self.rgbw[~np.isin(self.rgbw, channels).any(axis=1)]
+
+    def apply(self, out):
+        if len(self.rgbw):
+            rgb = out[self.rgbw[:, :3]]
+            white = rgb.min(axis=1)
+            out[self.rgbw[:, :3]] = rgb - white[:, None]
+            out[self.rgbw[:, 3]] = np.maximum(out[self.rgbw[:, 3]], white)
+        channels = self.channels
+        if len(channels):
+            out[channels] = self.luts[self.lut_index[channels], out[channels]]
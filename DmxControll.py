@@ -2,174 +2,442 @@ import os
 import json
 import time
 import threading
-from pyftdi.ftdi import Ftdi
+import numpy as np
 from IPython import embed
+from ColorPipeline import COLOR_PARAMS, OutputCorrection, color_weights, compile_profile
+from DmxOutput import DMX_UNIVERSE_SIZE, FtdiOutput, PrintOutput
+from DmxLayers import CommandBuffer, Layer, merge_layers
+from FixturePatch import FixturePatch
+from Latency import tracer
+from Metrics import registry
+from Runtime import Runtime
+from Envelopes import EnvelopeEngine
+from SceneStore import SceneStore
+
+
+INTENSITY_PARAMS = ("dim",)
+NO_CHANNELS = np.zeros(0, dtype=np.intp)
+
+# Třídy kanálů s vlastním časem přechodu při crossfadu scén
+CHANNEL_CLASSES = {
+    "intensity": INTENSITY_PARAMS,
+    "color": COLOR_PARAMS,
+    "position": ("pan", "panF", "tilt", "tiltF", "speed"),
+}
+
+# Binární úložiště scén (SceneStore); starý config/scenes.json se převezme při prvním otevření
+SCENE_FILE = "config/scenes.dmxs"
+
+# Výchozí skupiny, pokud chybí config/groups.json
+DEFAULT_GROUP_RANGES = {
+    "bass": (1, 9),
+    "midA": (100, 119),
+    "midB": (120, 139),
+    "midC": (140, 159),
+    "highA": (300, 359),
+    "highB": (360, 499),
+    "special": (499, 510),
+    "strip": (10, 99)
+}
+
+
+def intensity_channels(light):
+    """Ploché adresy kanálů, které u světla určují jas."""
+    params = [p for p in INTENSITY_PARAMS if p in light.channels]
+    if not params:
+        params = [p for p in COLOR_PARAMS if p in light.channels]
+    return [light.universe * DMX_UNIVERSE_SIZE + light.channels[p] for p in params]
 
 
 class DMXController:
-    def __init__(self):
-        self.buffer = [0] * 512
+    """
+    Sada DMX universe v jednom poli (universe x 512). Světla se adresují
+    dvojicí (universe, adresa); hromadné zápisy používají plochý index
+    universe * 512 + adresa, takže jdou napříč universy jedním zápisem.
+
+    Zdroje řízení nezapisují přímo do výstupu, ale každý do své vrstvy
+    (`layer`). `render` je jednou za DMX tick složí podle HTP/LTP pravidel
+    a priorit do `frames`. Přímé zápisy na controller jdou do vrstvy "base".
+
+    Grand master a submastery skupin jsou jen čísla; na stmívací kanály
+    se uplatní jedním násobením až při skládání výstupního snímku. Stejně
+    tak převod RGB -> RGBW a tabulky profilů (bílý bod, křivky stmívačů).
+    Výstupní fáze mění jen `frames`; `levels` drží úrovně vrstev před ní.
+
+    Procesory (`add_processor`) – sekvencery, efekty – dostanou na začátku
+    každého `render` volání `tick(now)` a zapíší do svých vrstev; hodinami
+    jim je DMX tick, ne vlastní vlákno.
+    """
+    def __init__(self, universes=1):
+        self.frames = np.zeros((universes, DMX_UNIVERSE_SIZE), dtype=np.uint8)
+        # Složené vrstvy před mastery a korekcí výstupu – z nich se ukládají
+        # scény, aby se mastery, křivky ani RGB -> RGBW při načtení
+        # neuplatnily podruhé
+        self.levels = np.zeros_like(self.frames)
+        self.htp = np.zeros(self.frames.size, dtype=bool)
         self.lock = threading.Lock()
-
-    def set_value(self, address, value):
-        if 0 <= address < 512:
+        # Celý render (procesory, flush zásobníků, skládání) běží vždy jen jednou
+        # najednou – volá ho DMX tick runtime i např. save_scene z GUI
+        self.render_lock = threading.Lock()
+        self.layers = {}
+        self.command_buffers = {}
+        self.base = self.layer("base")
+        self.patch = FixturePatch()
+        self.processors = []
+        self.correction = OutputCorrection(self.frames.size)
+        self._profile_luts = {}
+        self.m_render = registry.histogram("dmx_render_seconds", "Doba renderu snímku")
+        self.pending_capture = 0.0  # time.monotonic() audia čekajícího na další render
+        self.frame_capture = 0.0
+
+        self.grand_master = 1.0
+        self.masterable = np.zeros(self.frames.size, dtype=bool)
+        self.channel_submaster = np.zeros(self.frames.size, dtype=np.intp)
+        self.submaster_levels = np.ones(1)  # index 0 = kanál bez submasteru
+        self.submasters = {}
+        self._master_channels = np.zeros(0, dtype=np.intp)
+
+    @property
+    def universes(self):
+        return self.frames.shape[0]
+
+    @property
+    def buffer(self):
+        return self.frames[0]
+
+    def ensure_universes(self, count):
+        if count > self.universes:
             with self.lock:
-                self.buffer[address] = max(0, min(255, value))
+                grown = np.zeros((count, DMX_UNIVERSE_SIZE), dtype=np.uint8)
+                grown[:self.universes] = self.frames
+                self.frames = grown
+                levels = np.zeros_like(grown)
+                levels[:len(self.levels)] = self.levels
+                self.levels = levels
+                for attr in ("htp", "masterable", "channel_submaster"):
+                    old = getattr(self, attr)
+                    new = np.zeros(grown.size, dtype=old.dtype)
+                    new[:len(old)] = old
+                    setattr(self, attr, new)
+                for layer in self.layers.values():
+                    layer.resize(grown.size)
+                self.correction.resize(grown.size)
 
-    def get_value(self, address):
-        if 0 <= address < 512:
+    @staticmethod
+    def channel(universe, address):
+        return universe * DMX_UNIVERSE_SIZE + address
+
+    def layer(self, name, priority=None):
+        """Vrátí (případně vytvoří) vrstvu zdroje; priorita jde změnit i později."""
+        with self.lock:
+            layer = self.layers.get(name)
+            if layer is None:
+                layer = self.layers[name] = Layer(name, self.frames.size, priority or 0)
+            elif priority is not None:
+                layer.priority = priority
+        return layer
+
+    def commands(self, name, priority=None):
+        """Zásobník příkazů vrstvy – zápisy se sloučí a předají na hranici snímku."""
+        layer = self.layer(name, priority)
+        with self.lock:
+            buffer = self.command_buffers.get(name)
+            if buffer is None:
+                buffer = self.command_buffers[name] = CommandBuffer(layer)
+                registry.counter("dmx_commands_submitted_total", "Zápisy přijaté do zásobníku příkazů",
+                                 fn=lambda: buffer.submitted, layer=name)
+                registry.counter("dmx_commands_applied_total", "Zápisy skutečně předané vrstvě",
+                                 fn=lambda: buffer.applied, layer=name)
+        return buffer
+
+    def add_processor(self, processor):
+        if processor not in self.processors:
+            self.processors = self.processors + [processor]
+
+    def remove_processor(self, processor):
+        self.processors = [p for p in self.processors if p is not processor]
+
+    def set_htp(self, channels, enabled=True):
+        """Označí kanály (ploché adresy) jako HTP – typicky stmívače."""
+        self.htp[channels] = enabled
+
+    def set_masterable(self, channels, enabled=True):
+        """Kanály, které tlumí grand master a submastery (stmívače)."""
+        self.masterable[channels] = enabled
+        self._master_channels = np.flatnonzero(self.masterable)
+
+    def register_output(self, row, profile):
+        """Zkompilované tabulky profilu (bílý bod, křivka) pro kanály světla."""
+        luts = self._profile_luts.get(id(profile))
+        if luts is None:
+            luts = self._profile_luts[id(profile)] = compile_profile(profile)
+        with self.lock:
+            for param, lut in luts.items():
+                channel = self.patch.channel(row, param)
+                if channel >= 0:
+                    self.correction.set_lut([channel], lut)
+            if profile.rgb_to_w:
+                self.correction.add_rgbw(*(self.patch.channel(row, p) for p in ("r", "g", "b", "w")))
+
+    def unregister_output(self, row):
+        channels = self.patch.table[row, :len(self.patch.params)]
+        with self.lock:
+            self.correction.remove(channels[channels >= 0])
+
+    def set_grand_master(self, level):
+        self.grand_master = max(0.0, min(1.0, float(level)))
+
+    def register_submaster(self, name, channels):
+        """Přiřadí kanály k submasteru skupiny; kanál patří nejvýš jednomu."""
+        with self.lock:
+            index = self.submasters.get(name)
+            if index is None:
+                index = self.submasters[name] = len(self.submaster_levels)
+                self.submaster_levels = np.append(self.submaster_levels, 1.0)
+            self.channel_submaster[self.channel_submaster == index] = 0
+            self.channel_submaster[channels] = index
+        return index
+
+    def set_submaster(self, name, level):
+        index = self.submasters.get(name)
+        if index is not None:
+            self.submaster_levels[index] = max(0.0, min(1.0, float(level)))
+
+    def _apply_masters(self, out):
+        channels = self._master_channels
+        if len(channels) == 0:
+            return
+        if self.grand_master == 1.0 and not (self.submaster_levels < 1.0).any():
+            return
+        scale = self.submaster_levels[self.channel_submaster[channels]] * self.grand_master
+        out[channels] = (out[channels] * scale + 0.5).astype(np.uint8)
+
+    def fade_times(self, fade=0.5, class_times=None):
+        """
+        Čas přechodu pro každý kanál: výchozí `fade`, třídy kanálů
+        z `class_times` (např. {"intensity": 1.0, "position": 3.0}) vlastní.
+        """
+        times = np.full(self.frames.size, fade, dtype=np.float32)
+        for name, duration in (class_times or {}).items():
+            if name not in CHANNEL_CLASSES:
+                raise ValueError(f"Neznámá třída kanálů '{name}'.")
+            for param in CHANNEL_CLASSES[name]:
+                times[self.patch.all_channels(param)] = duration
+        return times
+
+    def set_value(self, address, value, universe=0):
+        self.base.set_value(address, value, universe)
+
+    def get_value(self, address, universe=0):
+        return self.base.get_value(address, universe)
+
+    def write(self, channels, values):
+        """Zapíše hodnoty na ploché adresy ve všech universech najednou."""
+        self.base.write(channels, values)
+
+    def load_frames(self, frames):
+        """Přepíše universa daty scény (1D = universe 0, 2D = více universe)."""
+        self.ensure_universes(np.atleast_2d(frames).shape[0])
+        self.base.load_frames(frames)
+
+    def render(self):
+        """Složí vrstvy do výstupního snímku – volá se jednou za DMX tick."""
+        with self.render_lock:
+            start = time.perf_counter()
+            now = time.monotonic()
+            for processor in self.processors:
+                processor.tick(now)
+            for buffer in list(self.command_buffers.values()):
+                buffer.flush()
             with self.lock:
-                return self.buffer[address]
-        return 0
-
-    def update(self):
+                layers = list(self.layers.values())
+                for layer in layers:
+                    layer.advance(now)
+                levels = self.levels.reshape(-1)
+                merge_layers(layers, self.htp, out=levels)
+                out = self.frames.reshape(-1)
+                out[:] = levels
+                self._apply_masters(out)
+                self.correction.apply(out)
+            # Snímek nese nejstarší audio, jehož změny obsahuje
+            self.frame_capture, self.pending_capture = self.pending_capture, 0.0
+            tracer.since("frame", self.frame_capture)
+            self.m_render.observe(time.perf_counter() - start)
+
+    def note_capture(self, capture_time):
+        """Zápisy do vrstev vychází z audia zachyceného v `capture_time`."""
+        if not self.pending_capture or capture_time < self.pending_capture:
+            self.pending_capture = capture_time
+
+    def snapshot(self):
+        with self.lock:
+            return self.frames.copy()
+
+    def levels_snapshot(self):
+        """Úrovně vrstev z posledního renderu před mastery a korekcí (bílý bod, křivky, RGBW)."""
+        with self.lock:
+            return self.levels.copy()
+
+    def update(self, universes=(0,)):
         pass
 
-    def _fade_single(self, addr, target, duration=0.5):
-        if not hasattr(self, '_fade_threads'):
-            self._fade_threads = {}
-
-        if addr in self._fade_threads:
-            self._fade_threads[addr].set()
-
-        stop_event = threading.Event()
-        self._fade_threads[addr] = stop_event
-
-        def interpolator():
-            start = self.get_value(addr)
-            steps = max(1, int(duration / 0.05))
-            for i in range(steps):
-                if stop_event.is_set():
-                    return
-                val = int(start + (target - start) * (i + 1) / steps)
-                self.set_value(addr, val)
-                time.sleep(0.05)
-            self.set_value(addr, target)
-
-        threading.Thread(target=interpolator, daemon=True).start()
+    def _fade_single(self, addr, target, duration=0.5, universe=0):
+        self.base._fade_single(addr, target, duration, universe)
 
 
 class Light:
-    """Základní třída světla, sdílí jméno, adresu a přístup k DMX controlleru."""
-    def __init__(self, name, address, dmx):
+    """
+    Základní třída světla – lehký handle (jméno, adresa, universe) na řádek
+    v patch tabulce DMXControlleru. Rozložení kanálů nese sdílený profil.
+    """
+    __slots__ = ("name", "address", "universe", "dmx", "row", "profile")
+
+    def __init__(self, name, address, dmx, universe=0):
         self.name = name
         self.address = address
+        self.universe = universe
         self.dmx = dmx
-        self._fade_threads = {}
-        self.channels = {}  # Mapování parametrů (např. 'r', 'g', 'pan') na adresy
+        self.row = -1  # řádek v dmx.patch
+        self.profile = None
 
     def __str__(self):
         return json.dumps(self.to_dict(), ensure_ascii=False)
 
+    @property
+    def dmx_address(self):
+        return (self.universe, self.address)
+
+    @property
+    def channels(self):
+        """Mapování parametrů (např. 'r', 'g', 'pan') na adresy v universe."""
+        return self.dmx.patch.row_channels(self.row) if self.row >= 0 else {}
+
     def to_dict(self):
-        data = {**self.__dict__, "type": type(self).__name__.lower()}
-        data.pop("dmx", None)
-        data.pop("_fade_threads", None)
+        data = {"name": self.name, "address": self.address}
+        if self.universe:
+            data["universe"] = self.universe
+        if self.profile is not None and not self.profile.anonymous:
+            data["profile"] = self.profile.name
+            return data
+        if self.row >= 0:
+            data.update(self.dmx.patch.row_offsets(self.row))
+        data["type"] = type(self).__name__.lower()
         return data
 
     @staticmethod
     def from_dict(data, dmx):
-        light_type = data.pop("type")
+        if "profile" in data:
+            data["profile"] = dmx.patch.profiles.get(data["profile"])
+            light_type = data.pop("type", data["profile"].type)
+        else:
+            light_type = data.pop("type")
         light_classes = {
             "dimr": Dimr,
             "par": Par,
             "head": Head,
             "haze": Haze
         }
+        if isinstance(data.get("address"), (list, tuple)):
+            data["universe"], data["address"] = data["address"]
         return light_classes[light_type](dmx=dmx, **data)
 
-    def init_channels(self, data):
-        """Inicializuje mapu kanálů podle offsetů v načtených datech."""
-        for param, offset in data.items():
-            if isinstance(offset, int) and offset > 0:
-                self.channels[param] = self.address + (offset - 1)
-
-    def set_param(self, param, value):
-        """Nastaví daný parametr světla na hodnotu pomocí interpolace."""
-        if param in self.channels:
-            addr = self.channels[param]
-            self._fade_single(addr, value)
-
-    def _fade_single(self, addr, target, duration=0.5):
-        if addr in self._fade_threads:
-            self._fade_threads[addr].set()
+    def init_channels(self, data, profile=None):
+        """Zapíše světlo do patch tabulky podle profilu nebo offsetů v načtených datech."""
+        if profile is None:
+            profile = self.dmx.patch.profiles.intern(type(self).__name__.lower(), data)
+        self.profile = profile
+        self.row = self.dmx.patch.add_profile(self.universe, self.address, profile)
 
-        stop_event = threading.Event()
-        self._fade_threads[addr] = stop_event
-
-        def interpolator():
-            start = self.dmx.get_value(addr)
-            steps = max(1, int(duration / 0.05))
-            for i in range(steps):
-                if stop_event.is_set():
-                    return
-                val = int(start + (target - start) * (i + 1) / steps)
-                self.dmx.set_value(addr, val)
-                time.sleep(0.05)
-            self.dmx.set_value(addr, target)
-
-        threading.Thread(target=interpolator, daemon=True).start()
+    def set_param(self, param, value, layer=None):
+        """Nastaví daný parametr světla na hodnotu pomocí interpolace (ve vrstvě zdroje)."""
+        if self.row < 0:
+            return
+        channel = self.dmx.patch.channel(self.row, param)
+        if channel >= 0:
+            target = layer if layer is not None else self.dmx.base
+            target.fade_to([channel], value)
 
 
 class Dimr(Light):
-    def __init__(self, name, address, dmx, **kwargs):
-        super().__init__(name, address, dmx)
-        self.init_channels(kwargs)
+    __slots__ = ()
+
+    def __init__(self, name, address, dmx, universe=0, profile=None, **kwargs):
+        super().__init__(name, address, dmx, universe)
+        self.init_channels(kwargs, profile)
 
-    def set_dim(self, value):
-        self.set_param("dim", value)
+    def set_dim(self, value, layer=None):
+        self.set_param("dim", value, layer)
 
 
 class Par(Light):
-    def __init__(self, name, address, dmx, **kwargs):
-        super().__init__(name, address, dmx)
-        self.init_channels(kwargs)
+    __slots__ = ()
 
-    def set_color(self, r=0, g=0, b=0, w=0, uv=0):
+    def __init__(self, name, address, dmx, universe=0, profile=None, **kwargs):
+        super().__init__(name, address, dmx, universe)
+        self.init_channels(kwargs, profile)
+
+    def set_color(self, r=0, g=0, b=0, w=0, uv=0, layer=None):
         for param, val in zip(["r", "g", "b", "w", "uv"], [r, g, b, w, uv]):
-            self.set_param(param, val)
+            self.set_param(param, val, layer)
 
-    def set_dim(self, value):
-        self.set_param("dim", value)
+    def set_dim(self, value, layer=None):
+        self.set_param("dim", value, layer)
 
-    def set_strobe(self, value):
-        self.set_param("strobo", value)
+    def set_strobe(self, value, layer=None):
+        self.set_param("strobo", value, layer)
 
 
 class Head(Par):
-    def __init__(self, name, address, dmx, base_pan=127, base_tilt=127, **kwargs):
-        super().__init__(name, address, dmx, **kwargs)
+    __slots__ = ("base_pan", "base_tilt")
+
+    def __init__(self, name, address, dmx, universe=0, base_pan=127, base_tilt=127, profile=None, **kwargs):
+        super().__init__(name, address, dmx, universe, profile, **kwargs)
         self.base_pan = base_pan
         self.base_tilt = base_tilt
 
-    def set_position(self, pan, tilt):
-        self.set_param("pan", pan)
-        self.set_param("tilt", tilt)
+    def to_dict(self):
+        data = super().to_dict()
+        data.update(base_pan=self.base_pan, base_tilt=self.base_tilt)
+        if "type" in data:
+            data["type"] = data.pop("type")
+        return data
+
+    def set_position(self, pan, tilt, layer=None):
+        self.set_param("pan", pan, layer)
+        self.set_param("tilt", tilt, layer)
 
-    def set_movement_speed(self, value):
-        self.set_param("speed", value)
+    def set_movement_speed(self, value, layer=None):
+        self.set_param("speed", value, layer)
 
-    def set_zoom(self, value):
-        self.set_param("zoom", value)
+    def set_zoom(self, value, layer=None):
+        self.set_param("zoom", value, layer)
 
 
 class Haze(Light):
-    def __init__(self, name, address, dmx, **kwargs):
-        super().__init__(name, address, dmx)
-        self.init_channels(kwargs)
+    __slots__ = ()
+
+    def __init__(self, name, address, dmx, universe=0, profile=None, **kwargs):
+        super().__init__(name, address, dmx, universe)
+        self.init_channels(kwargs, profile)
 
-    def set_haze(self, value):
-        self.set_param("haze", value)
+    def set_haze(self, value, layer=None):
+        self.set_param("haze", value, layer)
 
-    def set_fan(self, value):
-        self.set_param("fan", value)
+    def set_fan(self, value, layer=None):
+        self.set_param("fan", value, layer)
 
 
 class LightPlot:
-    def __init__(self, filename, dmx):
+    def __init__(self, filename, dmx, profiles_file=None):
         self.filename = filename
         self.lights = []
         self.dmx = dmx
+        self.version = 0  # zvyšuje se při každé změně plotu (pro indexy skupin)
+        if profiles_file is None:
+            profiles_file = os.path.join(os.path.dirname(filename), "profiles.json")
+            if not os.path.exists(profiles_file):
+                profiles_file = "config/profiles.json"
+        self.dmx.patch.profiles.load(profiles_file)
         self.load_lights()
 
     def load_lights(self):
@@ -183,6 +451,25 @@ class LightPlot:
                     continue
                 data = json.loads(line)
                 self.lights.append(Light.from_dict(data, self.dmx))
+        self.dmx.ensure_universes(self.universe_count())
+        for light in self.lights:
+            self.mark_intensity(light)
+        self.version += 1
+
+    def mark_intensity(self, light):
+        """
+        Stmívací kanály světla se slučují jako HTP a tlumí je mastery.
+        Světla bez stmívače tlumí mastery přes barevné kanály.
+        """
+        channels = intensity_channels(light)
+        if channels and "dim" in light.channels:
+            self.dmx.set_htp(channels)
+        self.dmx.set_masterable(channels)
+        if light.profile is not None:
+            self.dmx.register_output(light.row, light.profile)
+
+    def universe_count(self):
+        return max((light.universe for light in self.lights), default=0) + 1
 
     def save_lights(self):
         with open(self.filename, "w", encoding="utf-8") as file:
@@ -191,11 +478,17 @@ class LightPlot:
 
     def add_light(self, light):
         self.lights.append(light)
+        self.dmx.ensure_universes(light.universe + 1)
+        self.mark_intensity(light)
+        self.version += 1
         self.save_lights()
 
     def remove_light(self, index):
         if 0 <= index < len(self.lights):
             removed_light = self.lights.pop(index)
+            self.dmx.unregister_output(removed_light.row)
+            self.dmx.patch.remove(removed_light.row)
+            self.version += 1
             self.save_lights()
             return removed_light
         return None
@@ -206,231 +499,339 @@ class LightPlot:
 
 
 class LightManager:
-    def __init__(self, light_file="light_plot.txt", dmx_frequency=45):
-        devices = list(Ftdi.list_devices())
-        if not devices:
-            raise RuntimeError("Žádné FTDI zařízení nenalezeno.")
-        first_device = devices[0][0]
-        vid, pid = first_device.vid, first_device.pid
-
-        self.ftdi = Ftdi()
-        self.ftdi.open(vid, pid)
-        self.ftdi.set_baudrate(250000)
-        self.ftdi.set_line_property(8, 2, 'N')
+    """
+    Odesílá DMX buffer do výstupů (FTDI, Art-Net, sACN...) z periodických
+    úloh sdíleného Runtime. Bez zadaných výstupů se použije první FTDI zařízení.
+    """
+    start_message = "DMX Připojeno..."
+
+    def __init__(self, light_file="light_plot.txt", dmx_frequency=45, outputs=None, universe_rates=None,
+                 runtime=None):
+        if outputs is None:
+            outputs = [FtdiOutput()]
+        self.outputs = list(outputs)
 
         self.dmx = DMXController()
         self.dmx.update = self._send_dmx_data
         self.light_plot = LightPlot(light_file, self.dmx)
 
-        self.running = True
         self.dmx_frequency = dmx_frequency
-        self.dmx_thread = threading.Thread(target=self.dmx_loop, daemon=True)
-        self.dmx_thread.start()
-        print("DMX Připojeno...")
-
-    def _send_dmx_data(self):
-        self.ftdi.set_break(True)
-        self.ftdi.set_break(False)
-        self.ftdi.write_data(bytes(self.dmx.buffer))
-
-    def dmx_loop(self):
-        interval = 1 / self.dmx_frequency
-        while self.running:
-            self.dmx.update()
-            time.sleep(interval)
+        self.universe_rates = dict(universe_rates or {})  # universe -> Hz, jinak dmx_frequency
+        # Jedna úloha runtime na každou frekvenci; universe se stejnou
+        # frekvencí se odešlou z jednoho renderu
+        self.m_frames = {}
+        self.m_send = registry.histogram("dmx_send_seconds", "Doba renderu a odeslání snímku")
+        self.runtime = runtime or Runtime.shared()
+        rates = sorted({dmx_frequency, *self.universe_rates.values()})
+        self.tasks = [self.runtime.every(1 / rate, lambda rate=rate: self.dmx_tick(rate), name=f"dmx@{rate}Hz")
+                      for rate in rates]
+        print(self.start_message)
+
+    def _send_dmx_data(self, universes=(0,)):
+        start = time.perf_counter()
+        self.dmx.render()
+        frames = self.dmx.snapshot()
+        for universe in universes:
+            data = frames[universe].tobytes()
+            for output in self.outputs:
+                output.send(universe, data)
+            frames_sent = self.m_frames.get(universe)
+            if frames_sent is None:
+                frames_sent = self.m_frames[universe] = registry.counter(
+                    "dmx_frames_total", "Odeslané DMX snímky", universe=universe)
+            frames_sent.inc()
+        tracer.since("wire", self.dmx.frame_capture)
+        self.m_send.observe(time.perf_counter() - start)
+
+    def dmx_tick(self, rate):
+        due = [u for u in range(self.dmx.universes) if self.universe_rates.get(u, self.dmx_frequency) == rate]
+        if due:
+            self.dmx.update(due)
 
     def cleanup(self):
-        self.running = False
-        self.dmx_thread.join()
-        self.ftdi.close()
+        for task in self.tasks:
+            self.runtime.cancel(task)
+        for output in self.outputs:
+            output.close()
 
 
-class SimulatorManager:
-    def __init__(self, light_file="light_plot.txt", dmx_frequency=2):
-        self.dmx = DMXController()
-        self.dmx.update = self._simulate_dmx_output
-        self.light_plot = LightPlot(light_file, self.dmx)
-        self.running = True
-        self.dmx_frequency = dmx_frequency
-        self.dmx_thread = threading.Thread(target=self.dmx_loop, daemon=True)
-        self.dmx_thread.start()
-        print("Simulátor DMX spuštěn...")
-
-    def _simulate_dmx_output(self):
-        active_channels = [(i, val) for i, val in enumerate(self.dmx.buffer) if val > 0]
-        if active_channels:
-            print("Aktivní kanály:")
-            for addr, val in active_channels:
-                print(f"  Kanál {addr+1}: {val}")
-            print("-----")
-
-    def dmx_loop(self):
-        interval = 1 / self.dmx_frequency
-        while self.running:
-            self.dmx.update()
-            time.sleep(interval)
+class SimulatorManager(LightManager):
+    start_message = "Simulátor DMX spuštěn..."
+
+    def __init__(self, light_file="light_plot.txt", dmx_frequency=42, outputs=None, universe_rates=None,
+                 runtime=None):
+        super().__init__(light_file, dmx_frequency, outputs or [PrintOutput()], universe_rates, runtime)
 
     def cleanup(self):
         print("Ukončuji DMX simulátor...")
-        self.running = False
-        self.dmx_thread.join()
+        super().cleanup()
+
+
+class Group:
+    """
+    Předpočítaná skupina: světla, jejich řádky v patchi a pole plochých
+    adres pro každý parametr. Barevné kanály jsou navíc spojené do jednoho
+    pole, takže nastavení barvy celé skupiny je jeden zápis.
+    """
+    __slots__ = ("name", "lights", "rows", "channels", "fine_channels", "color_channels", "color_weights")
+
+    def __init__(self, name, lights, patch):
+        self.name = name
+        self.lights = lights
+        self.rows = np.array([light.row for light in lights if light.row >= 0], dtype=np.intp)
+        self.channels = {}
+        for param in patch.params:
+            channels = patch.channels(self.rows, param)
+            if len(channels):
+                self.channels[param] = channels
+
+        # Jemné kanály 16bitových parametrů podle `fine` profilu každého světla
+        fine = {}
+        for light in lights:
+            if light.row < 0 or light.profile is None:
+                continue
+            for coarse, param in light.profile.fine.items():
+                channel = patch.channel(light.row, param)
+                if channel >= 0:
+                    fine.setdefault(coarse, []).append(channel)
+        self.fine_channels = {coarse: np.array(c, dtype=np.intp) for coarse, c in fine.items()}
+
+        # Barva (r, g, b, w, uv) -> hodnoty barevných kanálů skupiny jedním násobením
+        # matice; světlům bez W/UV se tyto složky rozloží do RGB místo zahození.
+        layouts = [tuple(p for p in COLOR_PARAMS if patch.channel(row, p) >= 0) for row in self.rows.tolist()]
+        fold = {layout: color_weights(layout) for layout in set(layouts)}
+        channels, weights = [], []
+        for param in COLOR_PARAMS:
+            if param not in self.channels:
+                continue
+            channels.append(self.channels[param])
+            weights += [fold[layout][layout.index(param)] for layout in layouts if param in layout]
+        self.color_channels = np.concatenate(channels) if channels else NO_CHANNELS
+        self.color_weights = np.array(weights).reshape(-1, len(COLOR_PARAMS))
+
+    def param_channels(self, param):
+        return self.channels.get(param, NO_CHANNELS)
+
+    def fine_param_channels(self, param):
+        """Jemné kanály k hrubému parametru (např. "pan") u světel, která je mají."""
+        return self.fine_channels.get(param, NO_CHANNELS)
+
+
+class GroupIndex:
+    """
+    Pojmenované skupiny z config/groups.json přeložené na předpočítané `Group`.
+
+    Skupina se definuje rozsahy adres ([start, end] v universe 0 nebo
+    [universe, start, end]) a/nebo jmény světel. Index se přestaví jen
+    když se změní light plot (LightPlot.version).
+    """
+    def __init__(self, light_plot, groups_file="config/groups.json"):
+        self.light_plot = light_plot
+        self.definitions = self.load_definitions(groups_file)
+        self._groups = {}
+        self._version = None
+
+    @staticmethod
+    def load_definitions(groups_file):
+        if groups_file and os.path.exists(groups_file):
+            with open(groups_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        else:
+            raw = {name: {"ranges": [list(span)]} for name, span in DEFAULT_GROUP_RANGES.items()}
+
+        definitions = {}
+        for name, spec in raw.items():
+            spans = [tuple(span) if len(span) == 3 else (0, *span) for span in spec.get("ranges", [])]
+            definitions[name] = {"ranges": spans, "fixtures": list(spec.get("fixtures", []))}
+        return definitions
+
+    def names(self):
+        return list(self.definitions.keys())
+
+    def define(self, name, ranges=(), fixtures=()):
+        spans = [tuple(span) if len(span) == 3 else (0, *span) for span in ranges]
+        self.definitions[name] = {"ranges": spans, "fixtures": list(fixtures)}
+        self._version = None
+
+    def rebuild(self):
+        lights = self.light_plot.lights
+        by_name = {}
+        for light in lights:
+            by_name.setdefault(light.name, []).append(light)
+
+        groups = {}
+        for name, spec in self.definitions.items():
+            members = [light for light in lights
+                       if any(light.universe == u and start <= light.address < end
+                              for u, start, end in spec["ranges"])]
+            for fixture in spec["fixtures"]:
+                members.extend(light for light in by_name.get(fixture, []) if light not in members)
+            groups[name] = Group(name, members, self.light_plot.dmx.patch)
+        self._groups = groups
+        self._version = self.light_plot.version
+
+    def get(self, name):
+        if self._version != self.light_plot.version:
+            self.rebuild()
+        return self._groups.get(name)
 
 
 class SceneManager:
-    def __init__(self, light_plot):
+    """
+    Skupinové operace nad světly. Každý SceneManager zapisuje do své vrstvy
+    DMXControlleru (výchozí "scene"); další zdroj získá přes `for_layer`.
+    Zápisy jdou přes zásobník příkazů (`commands`), takže opakované nebo
+    nic neměnící zápisy během snímku se slijí do jedné dávky.
+    """
+    def __init__(self, light_plot, layer="scene", priority=None, groups=None, pulses=None):
         self.light_plot = light_plot
-        self.ranges = {
-            "bass": (1, 9),
-            "midA": (100, 119),
-            "midB": (120, 139),
-            "midC": (140, 159),
-            "highA": (300, 359),
-            "highB": (360, 499),
-            "special":(499,510),
-            "strip":(10,99)
-        }
+        self.layer = light_plot.dmx.layer(layer, priority)
+        self.commands = light_plot.dmx.commands(layer)
+        self.pulses = pulses if pulses is not None else EnvelopeEngine(light_plot.dmx)
+        self.groups = groups if groups is not None else GroupIndex(light_plot)
+
+    def for_layer(self, layer, priority=None):
+        """SceneManager pro jiný zdroj řízení se stejnými skupinami a pulzy."""
+        return SceneManager(self.light_plot, layer, priority, groups=self.groups, pulses=self.pulses)
+
+    def get_lights_in_range(self, start, end, universe=0):
+        return [light for light in self.light_plot.lights
+                if light.universe == universe and start <= light.address < end]
 
-    def get_lights_in_range(self, start, end):
-        return [light for light in self.light_plot.lights if start <= light.address < end]
+    def get_group(self, group_name):
+        return self.groups.get(group_name)
 
     def get_group_lights(self, group_name):
-        if group_name in self.ranges:
-            start, end = self.ranges[group_name]
-            return self.get_lights_in_range(start, end)
-        return []
+        group = self.groups.get(group_name)
+        return group.lights if group is not None else []
+
+    def _param_channels(self, group, param):
+        group = self.groups.get(group)
+        return group.param_channels(param) if group is not None else NO_CHANNELS
 
     def blackout(self):
-        for light in self.light_plot.lights:
-            if hasattr(light, 'set_dim'):
-                light.set_dim(0)
+        dims = self.light_plot.dmx.patch.all_channels("dim")
+        for layer in list(self.light_plot.dmx.layers.values()):
+            layer.fade_to(dims, 0)
         print("provadim zhasnuti svetel")
 
     def set_color_for_group(self, group, color):
-        for light in self.get_group_lights(group):
-            if hasattr(light, 'set_color'):
-                r, g, b = color[0], color[1], color[2]
-                w = color[3] if len(color) > 3 else 0
-                uv = color[4] if len(color) > 4 else 0
-
-                supports_w = "w" in getattr(light, "channels", {})
-                supports_uv = "uv" in getattr(light, "channels", {})
-
-                light.set_color(
-                    r, g, b,
-                    w=w if supports_w else 0,
-                    uv=uv if supports_uv else 0
-                )
+        group = self.groups.get(group)
+        if group is None or len(group.color_channels) == 0:
+            return
+        # Chybějící W/UV se zapíše jako 0
+        components = np.zeros(len(COLOR_PARAMS))
+        components[:min(len(color), len(COLOR_PARAMS))] = color[:len(COLOR_PARAMS)]
+        self.commands.fade_to(group.color_channels, np.clip(group.color_weights @ components, 0, 255))
 
     def set_dim_for_group(self, group, value):
-        for light in self.get_group_lights(group):
-            if hasattr(light, 'set_dim'):
-                light.set_dim(value)
-
-    def pulse_on_beat(self, group, intensity=255, duration=0.2):
-        def pulse_thread():
-            time.sleep(0.03)
-            for light in self.get_group_lights(group):
-                if hasattr(light, 'set_dim'):
-                    light.set_dim(intensity)
-            time.sleep(duration)
-            for light in self.get_group_lights(group):
-                if hasattr(light, 'set_dim'):
-                    light.set_dim(128)
-
-        threading.Thread(target=pulse_thread, daemon=True).start()
+        self.commands.fade_to(self._param_channels(group, "dim"), value)
+
+    def pulse_on_beat(self, group, intensity=255, duration=0.2, attack=0.02, release=0.25, at=None):
+        """
+        Pulz stmívačů skupiny (attack/hold/release). S `at` = čas beatu se
+        stejný beat spustí jen jednou a začátek se srovná na latenci výstupu.
+        """
+        self.pulses.trigger(self._param_channels(group, "dim"), intensity,
+                            attack=attack, hold=duration, release=release, at=at, key=group)
 
     def set_zoom_for_group(self, group, value):
-        for light in self.get_group_lights(group):
-            if hasattr(light, 'set_zoom'):
-                light.set_zoom(value)
+        self.commands.fade_to(self._param_channels(group, "zoom"), value)
 
     def set_movement_for_group(self, group, pan=None, tilt=None, speed=None):
-        for light in self.get_group_lights(group):
-            if pan is not None or tilt is not None:
-                if hasattr(light, "channels"):
-                    if pan is not None and "pan" in light.channels:
-                        light.set_param("pan", pan)
-                        if "panF" in light.channels:
-                            light.set_param("panF", 0)
-                    if tilt is not None and "tilt" in light.channels:
-                        light.set_param("tilt", tilt)
-                        if "tiltF" in light.channels:
-                            light.set_param("tiltF", 0)
-
-            if speed is not None and hasattr(light, "set_movement_speed"):
-                light.set_movement_speed(speed)
+        # pan/tilt 0..255 (smí být desetinné) -> 16 bitů rozdělených na hrubý a jemný kanál
+        group = self.groups.get(group)
+        if group is None:
+            return
+        targets = []
+        for param, value in (("pan", pan), ("tilt", tilt)):
+            if value is not None:
+                value = int(round(min(max(value, 0), 255) * 257))
+                targets += [(group.param_channels(param), value >> 8),
+                            (group.fine_param_channels(param), value & 0xFF)]
+        if speed is not None:
+            targets.append((group.param_channels("speed"), speed))
+        if not targets:
+            return
+
+        channels = [c for c, _ in targets]
+        values = [np.full(len(c), value) for c, value in targets]
+        self.commands.fade_to(np.concatenate(channels), np.concatenate(values))
 
     def set_dim_all(self, value):
-        for group in self.ranges.keys():
+        for group in self.groups.names():
             self.set_dim_for_group(group, value)
 
+    def set_grand_master(self, level):
+        """Grand master 0.0–1.0; nemění hodnoty ve vrstvách, jen výstup."""
+        self.light_plot.dmx.set_grand_master(level)
+
+    def set_submaster(self, group, level):
+        """Submaster skupiny 0.0–1.0, uplatní se při skládání výstupu."""
+        dmx = self.light_plot.dmx
+        if group not in dmx.submasters:
+            channels = [c for light in self.get_group_lights(group) for c in intensity_channels(light)]
+            dmx.register_submaster(group, channels)
+        dmx.set_submaster(group, level)
+
     def alternating_light_strip(self, group, state=True, intensity=255):
-        lights = self.get_group_lights(group)
-        for i, light in enumerate(lights):
-            if hasattr(light, 'set_dim'):
-                if (i % 2 == 0 and state) or (i % 2 == 1 and not state):
-                    light.set_dim(intensity)
-                else:
-                    light.set_dim(0)
-
-    def save_scene(self, name, filename="vectorconfig/scenes.json"):
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = {}
-
-        data[name] = self.light_plot.dmx.buffer.copy()
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        dims = self._param_channels(group, "dim")
+        even = np.arange(len(dims)) % 2 == 0
+        self.commands.fade_to(dims, np.where(even == state, intensity, 0))
+
+    @staticmethod
+    def scene_store(filename=SCENE_FILE):
+        """Otevře úložiště scén; nový soubor převezme scény ze stejnojmenného .json."""
+        exists = os.path.exists(filename)
+        store = SceneStore.open(filename)
+        legacy = os.path.splitext(filename)[0] + ".json"
+        if not exists and os.path.exists(legacy):
+            names = store.import_json(legacy)
+            print(f"Převzato {len(names)} scén z {legacy}.")
+        return store
+
+    def save_scene(self, name, filename=SCENE_FILE):
+        # render je serializovaný zámkem, takže neběží souběžně s DMX tickem
+        self.light_plot.dmx.render()
+        self.scene_store(filename).save(name, self.light_plot.dmx.levels_snapshot())
         print(f"Scéna '{name}' byla uložena.")
 
-    def load_scene(self, name, interpolate=True, filename="vectorconfig/scenes.json"):
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            scene = data[name]
-        except (FileNotFoundError, KeyError):
+    def load_scene(self, name, interpolate=True, filename=SCENE_FILE, fade=0.5, curve="linear", fade_times=None):
+        frames = self.scene_store(filename).load(name)
+        if frames is None:
             print(f"Scéna '{name}' nebyla nalezena.")
             return
 
-        for addr, val in enumerate(scene):
-            if interpolate:
-                self.light_plot.dmx._fade_single(addr, val)
-            else:
-                self.light_plot.dmx.set_value(addr, val)
+        if interpolate:
+            self.crossfade(frames, fade, curve, fade_times)
+        else:
+            self.crossfade(frames, 0)
         print(f"Scéna '{name}' byla načtena.")
-    def delete_scene_from_file(self, name, filename="vectorconfig/scenes.json"):
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if name in data:
-                del data[name]
-                with open(filename, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"Scéna '{name}' byla odstraněna ze souboru.")
-            else:
-                print(f"Scéna '{name}' neexistuje v souboru.")
-        except FileNotFoundError:
-            print("Soubor scén neexistuje.")
-
-    def list_scenes_in_file(self, filename="vectorconfig/scenes.json"):
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            print("Dostupné scény:")
-            for name in data:
-                print(f" - {name}")
-        except FileNotFoundError:
-            print("Soubor scén neexistuje.")
-        except json.JSONDecodeError:
-            print("Soubor scén je poškozen nebo prázdný.")
-            
-    def ensure_scene_file(self, filename="vectorconfig/scenes.json"):
-        if not os.path.exists(filename):
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+
+    def crossfade(self, frames, fade=0.5, curve="linear", fade_times=None):
+        """
+        Prolne vrstvu z aktuálního stavu do celých snímků. Časy pro třídy
+        kanálů (intensity/color/position) lze zadat zvlášť ve `fade_times`.
+        """
+        frames = np.atleast_2d(frames)
+        dmx = self.light_plot.dmx
+        dmx.ensure_universes(len(frames))
+        duration = dmx.fade_times(fade, fade_times) if fade_times else fade
+        self.commands.load_frames(frames, duration, curve)
+
+    def delete_scene_from_file(self, name, filename=SCENE_FILE):
+        if self.scene_store(filename).delete(name):
+            print(f"Scéna '{name}' byla odstraněna ze souboru.")
+        else:
+            print(f"Scéna '{name}' neexistuje v souboru.")
+
+    def list_scenes_in_file(self, filename=SCENE_FILE):
+        print("Dostupné scény:")
+        for name in self.scene_store(filename).names():
+            print(f" - {name}")
+
+    def ensure_scene_file(self, filename=SCENE_FILE):
+        self.scene_store(filename)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,290 @@
+import itertools
+import threading
+import time
+import numpy as np
+from DmxOutput import DMX_UNIVERSE_SIZE
+
+
+# Společné pořadí zápisů pro LTP – vyšší číslo = novější zápis
+_write_counter = itertools.count(1)
+
+# Průběh přechodu: postup 0..1 v čase -> podíl cesty ke startu cíle.
+# Index v tuple je id křivky uložené u kanálu (0 = lineární, bez výpočtu).
+FADE_CURVES = (
+    ("linear", lambda p: p),
+    ("ease", lambda p: p * p * (3.0 - 2.0 * p)),
+    ("ease_in", lambda p: p * p),
+    ("ease_out", lambda p: 1.0 - (1.0 - p) ** 2),
+    ("snap", lambda p: np.floor(p)),
+)
+CURVE_IDS = {name: i for i, (name, _) in enumerate(FADE_CURVES)}
+
+
+def curve_id(curve):
+    if curve not in CURVE_IDS:
+        raise ValueError(f"Neznámá křivka přechodu '{curve}'.")
+    return CURVE_IDS[curve]
+
+
+def frame_channels(frames):
+    """Ploché adresy všech kanálů snímků (universe x kanál)."""
+    return (np.arange(frames.shape[0])[:, None] * DMX_UNIVERSE_SIZE
+            + np.arange(frames.shape[1])).reshape(-1)
+
+
+class Layer:
+    """
+    Vrstva jednoho zdroje řízení (GUI, VectorClass, scény, pulzy...).
+
+    Každý zdroj zapisuje jen do své vrstvy: `values` drží hodnoty, `active`
+    říká, které kanály vrstva ovládá, a `stamps` pořadí posledního zápisu
+    kanálu pro LTP. Výsledný snímek skládá `merge_layers` jednou za DMX tick.
+
+    Přechody (fade) nejsou vlákna, ale pole začátek/cíl/čas/křivka na kanál;
+    `advance` je dopočítá pro všechny kanály najednou při každém ticku.
+    Nový přechod na kanálu jen přepíše jeho řádek, takže libovolně mnoho
+    překrývajících se crossfadů stojí za tick stejně.
+    """
+    def __init__(self, name, size, priority=0):
+        self.name = name
+        self.priority = priority
+        self.values = np.zeros(size, dtype=np.uint8)
+        self.active = np.zeros(size, dtype=bool)
+        self.stamps = np.zeros(size, dtype=np.int64)
+        self.fade_from = np.zeros(size, dtype=np.float32)
+        self.fade_target = np.zeros(size, dtype=np.float32)
+        self.fade_start = np.zeros(size, dtype=np.float64)
+        self.fade_time = np.zeros(size, dtype=np.float32)  # 0 = kanál nefaduje
+        self.fade_curve = np.zeros(size, dtype=np.uint8)
+        self.lock = threading.Lock()
+
+    _arrays = ("values", "active", "stamps", "fade_from", "fade_target", "fade_start", "fade_time", "fade_curve")
+
+    @property
+    def size(self):
+        return len(self.values)
+
+    def resize(self, size):
+        if size <= self.size:
+            return
+        with self.lock:
+            for attr in self._arrays:
+                old = getattr(self, attr)
+                grown = np.zeros(size, dtype=old.dtype)
+                grown[:len(old)] = old
+                setattr(self, attr, grown)
+
+    def set_value(self, address, value, universe=0):
+        if 0 <= address < DMX_UNIVERSE_SIZE:
+            channel = universe * DMX_UNIVERSE_SIZE + address
+            if channel < self.size:
+                with self.lock:
+                    self.values[channel] = max(0, min(255, int(value)))
+                    self.active[channel] = True
+                    self.stamps[channel] = next(_write_counter)
+                    self.fade_time[channel] = 0
+
+    def get_value(self, address, universe=0):
+        channel = universe * DMX_UNIVERSE_SIZE + address
+        if 0 <= address < DMX_UNIVERSE_SIZE and channel < self.size:
+            return int(self.values[channel])
+        return 0
+
+    def write(self, channels, values):
+        """Zapíše hodnoty na ploché adresy (universe * 512 + adresa) najednou."""
+        values = np.clip(np.asarray(values), 0, 255)
+        with self.lock:
+            self.values[channels] = values
+            self.active[channels] = True
+            self.stamps[channels] = next(_write_counter)
+            self.fade_time[channels] = 0
+
+    def fade_to(self, channels, targets, duration=0.5, curve="linear"):
+        """
+        Spustí přechod na cílové hodnoty pro všechny zadané kanály najednou.
+        `duration` může být i pole (čas pro každý kanál); kanály s časem 0
+        se zapíšou hned.
+        """
+        channels = np.asarray(channels, dtype=np.intp)
+        targets = np.clip(np.broadcast_to(np.asarray(targets, dtype=np.float32), channels.shape), 0, 255)
+        durations = np.broadcast_to(np.asarray(duration, dtype=np.float32), channels.shape)
+        if not (durations > 0).any():
+            self.write(channels, targets)
+            return
+        cid = curve_id(curve)
+        with self.lock:
+            self.fade_from[channels] = self.values[channels]
+            self.fade_target[channels] = targets
+            self.fade_start[channels] = time.monotonic()
+            self.fade_time[channels] = np.maximum(durations, 0)
+            self.fade_curve[channels] = cid
+            self.active[channels] = True
+            self.stamps[channels] = next(_write_counter)
+            instant = channels[durations <= 0]
+            self.values[instant] = targets[durations <= 0]
+
+    def advance(self, now):
+        """Dopočítá probíhající přechody k času `now` (volá se jednou za tick)."""
+        fading = np.flatnonzero(self.fade_time)
+        if len(fading) == 0:
+            return
+        with self.lock:
+            progress = np.clip((now - self.fade_start[fading]) / self.fade_time[fading], 0.0, 1.0)
+            done = fading[progress >= 1.0]
+            curves = self.fade_curve[fading]
+            if curves.any():
+                shaped = progress.copy()
+                for cid in np.unique(curves[curves > 0]):
+                    mask = curves == cid
+                    shaped[mask] = FADE_CURVES[cid][1](progress[mask])
+                progress = shaped
+            start = self.fade_from[fading]
+            self.values[fading] = np.rint(start + (self.fade_target[fading] - start) * progress)
+            self.fade_time[done] = 0
+
+    def load_frames(self, frames, duration=0, curve="linear"):
+        """
+        Převezme celé snímky scény (1D = universe 0, 2D = více universe).
+        S `duration` > 0 je to crossfade z aktuálních hodnot vrstvy;
+        `duration` může být pole o velikosti snímků (čas pro každý kanál).
+        """
+        frames = np.atleast_2d(np.clip(np.asarray(frames), 0, 255))
+        channels = frame_channels(frames)
+        if np.ndim(duration):
+            duration = np.asarray(duration).reshape(-1)[:len(channels)]
+        self.fade_to(channels, frames.reshape(-1), duration, curve)
+
+    def release(self, channels=None):
+        """Vrstva přestane ovládat dané kanály (bez argumentu všechny)."""
+        with self.lock:
+            if channels is None:
+                self.active[:] = False
+                self.fade_time[:] = 0
+            else:
+                self.active[channels] = False
+                self.fade_time[channels] = 0
+
+    def _fade_single(self, addr, target, duration=0.5, universe=0):
+        if 0 <= addr < DMX_UNIVERSE_SIZE:
+            self.fade_to([universe * DMX_UNIVERSE_SIZE + addr], target, duration)
+
+
+class CommandBuffer:
+    """
+    Zásobník příkazů pro vrstvu. Zápisy během snímku jen přepíší cíl
+    kanálu (pozdější zápis přebije dřívější); `flush` na hranici snímku
+    zahodí cíle, které se shodují s tím, kam kanál už míří, a zbytek
+    předá vrstvě jedním dávkovým `fade_to` na křivku.
+    """
+    def __init__(self, layer):
+        self.layer = layer
+        self.lock = threading.Lock()
+        self.submitted = 0   # kanálů zapsaných do bufferu
+        self.applied = 0     # kanálů, které po sloučení opravdu došly do vrstvy
+        self._allocate(layer.size)
+
+    def _allocate(self, size):
+        self.pending = np.zeros(size, dtype=bool)
+        self.target = np.zeros(size, dtype=np.float32)
+        self.duration = np.zeros(size, dtype=np.float32)
+        self.curve = np.zeros(size, dtype=np.uint8)
+
+    @property
+    def size(self):
+        return self.layer.size
+
+    def _grow(self):
+        if self.layer.size > len(self.pending):
+            old = (self.pending, self.target, self.duration, self.curve)
+            self._allocate(self.layer.size)
+            for new, prev in zip((self.pending, self.target, self.duration, self.curve), old):
+                new[:len(prev)] = prev
+
+    def fade_to(self, channels, targets, duration=0.5, curve="linear"):
+        channels = np.asarray(channels, dtype=np.intp)
+        targets = np.clip(np.broadcast_to(np.asarray(targets, dtype=np.float32), channels.shape), 0, 255)
+        durations = np.broadcast_to(np.asarray(duration, dtype=np.float32), channels.shape)
+        cid = curve_id(curve)
+        with self.lock:
+            self._grow()
+            self.pending[channels] = True
+            self.target[channels] = targets
+            self.duration[channels] = np.maximum(durations, 0)
+            self.curve[channels] = cid
+            self.submitted += len(channels)
+
+    def write(self, channels, values):
+        self.fade_to(channels, values, 0)
+
+    def load_frames(self, frames, duration=0, curve="linear"):
+        frames = np.atleast_2d(np.clip(np.asarray(frames), 0, 255))
+        channels = frame_channels(frames)
+        if np.ndim(duration):
+            duration = np.asarray(duration).reshape(-1)[:len(channels)]
+        self.fade_to(channels, frames.reshape(-1), duration, curve)
+
+    def release(self, channels=None):
+        with self.lock:
+            if channels is None:
+                self.pending[:] = False
+            else:
+                self.pending[channels] = False
+        self.layer.release(channels)
+
+    def flush(self):
+        """Předá vrstvě jen skutečné změny (volá se jednou za snímek)."""
+        with self.lock:
+            channels = np.flatnonzero(self.pending)
+            if len(channels) == 0:
+                return
+            self.pending[channels] = False
+            targets = self.target[channels]
+            durations = self.duration[channels]
+            curves = self.curve[channels]
+
+        layer = self.layer
+        heading = np.where(layer.fade_time[channels] > 0, layer.fade_target[channels], layer.values[channels])
+        changed = ~layer.active[channels] | (np.rint(targets) != heading)
+        if not changed.all():
+            channels, targets = channels[changed], targets[changed]
+            durations, curves = durations[changed], curves[changed]
+        for cid in np.unique(curves):
+            mask = curves == cid
+            layer.fade_to(channels[mask], targets[mask], durations[mask], FADE_CURVES[cid][0])
+        self.applied += len(channels)
+
+
+def merge_layers(layers, htp, out=None):
+    """
+    Složí vrstvy do jednoho snímku (plochý uint8 vektor).
+
+    Na každém kanálu rozhodují jen vrstvy s nejvyšší prioritou, které ho
+    ovládají. Mezi nimi HTP kanály (stmívače) berou maximum, LTP kanály
+    hodnotu z posledního zápisu. Kanály bez vrstvy jsou 0.
+    """
+    size = len(htp)
+    if out is None:
+        out = np.zeros(size, dtype=np.uint8)
+    if not layers:
+        out[:] = 0
+        return out
+
+    values = np.stack([layer.values[:size] for layer in layers])
+    active = np.stack([layer.active[:size] for layer in layers])
+    if len(layers) == 1:
+        np.multiply(values[0], active[0], out=out)
+        return out
+
+    stamps = np.stack([layer.stamps[:size] for layer in layers])
+    priorities = np.array([layer.priority for layer in layers], dtype=np.int64)[:, None]
+
+    ranked = np.where(active, priorities, np.iinfo(np.int64).min)
+    winners = active & (ranked == ranked.max(axis=0))
+
+    htp_values = np.where(winners, values, 0).max(axis=0)
+    latest = np.where(winners, stamps, -1).argmax(axis=0)
+    ltp_values = values[latest, np.arange(size)]
+
+    np.copyto(out, np.where(htp, htp_values, ltp_values))
+    out[~winners.any(axis=0)] = 0
+    return out
@@ -0,0 +1,239 @@
+import socket
+import struct
+import sys
+import time
+import uuid
+import numpy as np
+
+try:
+    from pyftdi.ftdi import Ftdi
+except ImportError:
+    Ftdi = None
+
+
+# Buffer DMXControlleru se posílá na drát tak, jak je: bajt 0 je start kód
+# a index v bufferu odpovídá číslu DMX kanálu. Síťové výstupy tuto konvenci
+# zachovávají, aby adresy v light_plot platily stejně pro FTDI i pro síť.
+DMX_UNIVERSE_SIZE = 512
+
+ARTNET_PORT = 6454
+SACN_PORT = 5568
+
+
+class OutputBackend:
+    """Základní rozhraní výstupu – dostává celé universe jako 512 bajtů."""
+    def send(self, universe, data):
+        raise NotImplementedError("Method send() must be implemented.")
+
+    def close(self):
+        pass
+
+
+class NullOutput(OutputBackend):
+    """Výstup, který data zahodí – pro testy a běh bez hardwaru."""
+    def __init__(self):
+        self.frames_sent = 0
+
+    def send(self, universe, data):
+        self.frames_sent += 1
+        return True
+
+
+class PrintOutput(OutputBackend):
+    """
+    Výstup simulátoru. Porovná snímek s minulým a vypíše jen změněné kanály,
+    buď jako kompaktní řádek logu, nebo do pevné tabulky v terminálu
+    (inplace=True), kde se přepisují jen změněné buňky.
+    """
+    columns = 16
+
+    def __init__(self, inplace=False, max_items=24, stream=None):
+        self.inplace = inplace
+        self.max_items = max_items
+        self.stream = stream or sys.stdout
+        self.start_time = time.monotonic()
+        self._last_frames = {}
+        self._table_rows = {}
+
+    def send(self, universe, data):
+        frame = np.frombuffer(data, dtype=np.uint8)
+        last = self._last_frames.get(universe)
+        if last is None:
+            last = np.zeros_like(frame)
+        changed = np.flatnonzero(frame != last)
+        if len(changed) == 0:
+            return False
+        self._last_frames[universe] = frame.copy()
+
+        if self.inplace:
+            self._render_table(universe, changed, frame[changed])
+        else:
+            self._render_line(universe, changed, frame[changed])
+        return True
+
+    def _render_line(self, universe, addrs, values):
+        t = time.monotonic() - self.start_time
+        shown = " ".join(f"{a+1}:{v}" for a, v in zip(addrs[:self.max_items].tolist(),
+                                                     values[:self.max_items].tolist()))
+        rest = f" (+{len(addrs) - self.max_items})" if len(addrs) > self.max_items else ""
+        self.stream.write(f"[{t:8.3f}] U{universe} | {shown}{rest}\n")
+        self.stream.flush()
+
+    def _render_table(self, universe, addrs, values):
+        # Každé universe má vlastní blok řádků; kurzorem se skočí jen na změněné buňky
+        if universe not in self._table_rows:
+            if not self._table_rows:
+                self.stream.write("\x1b[2J")
+            top = 1 + len(self._table_rows) * (DMX_UNIVERSE_SIZE // self.columns + 2)
+            self._table_rows[universe] = top
+            self.stream.write(f"\x1b[{top};1HUniverse {universe}")
+        top = self._table_rows[universe] + 1
+        rows = addrs // self.columns
+        cols = addrs % self.columns
+        out = [f"\x1b[{top + r};{c * 4 + 1}H{v:3d}" for r, c, v in zip(rows.tolist(), cols.tolist(), values.tolist())]
+        bottom = top + DMX_UNIVERSE_SIZE // self.columns
+        out.append(f"\x1b[{bottom};1H")
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+
+class FtdiOutput(OutputBackend):
+    """Výstup přes USB převodník ENTTEC Open DMX (FTDI), jedno universe."""
+    def __init__(self, universe=0, device_index=0):
+        if Ftdi is None:
+            raise RuntimeError("Knihovna pyftdi není nainstalována.")
+        devices = list(Ftdi.list_devices())
+        if len(devices) <= device_index:
+            raise RuntimeError("Žádné FTDI zařízení nenalezeno.")
+        device = devices[device_index][0]
+
+        self.universe = universe
+        self.ftdi = Ftdi()
+        self.ftdi.open(device.vid, device.pid)
+        self.ftdi.set_baudrate(250000)
+        self.ftdi.set_line_property(8, 2, 'N')
+
+    def send(self, universe, data):
+        if universe != self.universe:
+            return False
+        self.ftdi.set_break(True)
+        self.ftdi.set_break(False)
+        self.ftdi.write_data(bytes(data))
+        return True
+
+    def close(self):
+        self.ftdi.close()
+
+
+class NetworkOutput(OutputBackend):
+    """
+    Společný základ pro UDP výstupy (Art-Net, sACN).
+
+    Posílá jen universa, která se změnila; nezměněná universa se znovu
+    odešlou nejpozději po `keepalive` sekundách, aby uzly nepřešly do výpadku.
+    Cíl je buď jedna adresa (unicast/broadcast), nebo mapa universe -> host.
+    """
+    default_port = None
+
+    def __init__(self, host, port=None, broadcast=False, keepalive=1.0, universe_hosts=None):
+        self.host = host
+        self.port = port or self.default_port
+        self.keepalive = keepalive
+        self.universe_hosts = dict(universe_hosts or {})
+        self._last_sent = {}
+        self._sequence = {}
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if broadcast:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    def target(self, universe):
+        return (self.universe_hosts.get(universe, self.host), self.port)
+
+    def next_sequence(self, universe):
+        seq = self._sequence.get(universe, 0) % 255 + 1
+        self._sequence[universe] = seq
+        return seq
+
+    def build_packet(self, universe, data, sequence):
+        raise NotImplementedError("Method build_packet() must be implemented.")
+
+    def send(self, universe, data):
+        payload = bytes(data)
+        now = time.monotonic()
+        last = self._last_sent.get(universe)
+        if last is not None and last[0] == payload and now - last[1] < self.keepalive:
+            return False
+
+        packet = self.build_packet(universe, payload, self.next_sequence(universe))
+        self.sock.sendto(packet, self.target(universe))
+        self._last_sent[universe] = (payload, now)
+        return True
+
+    def close(self):
+        self.sock.close()
+
+
+class ArtNetOutput(NetworkOutput):
+    """Art-Net 4 (ArtDmx). Universe odpovídá 15bitové Port-Address."""
+    default_port = ARTNET_PORT
+    header = b"Art-Net\x00" + struct.pack("<H", 0x5000) + struct.pack(">H", 14)
+
+    def __init__(self, host="255.255.255.255", port=None, broadcast=None, keepalive=1.0, universe_hosts=None):
+        if broadcast is None:
+            broadcast = host.endswith(".255")
+        super().__init__(host, port, broadcast, keepalive, universe_hosts)
+
+    def build_packet(self, universe, data, sequence):
+        # Art-Net nenese start kód, kanál 1 je první bajt dat (délka musí být sudá)
+        slots = data[1:]
+        if len(slots) % 2:
+            slots += b"\x00"
+        return (self.header
+                + struct.pack("<BBH", sequence, 0, universe & 0x7FFF)
+                + struct.pack(">H", len(slots))
+                + slots)
+
+
+class SacnOutput(NetworkOutput):
+    """
+    sACN (E1.31) datový paket. Bez hostu se posílá multicastem
+    na 239.255.u.u; interní universe 0 odpovídá sACN universe 1.
+    """
+    default_port = SACN_PORT
+
+    def __init__(self, host=None, port=None, broadcast=False, keepalive=1.0, universe_hosts=None,
+                 source_name="wav_to_dmx", priority=100, universe_offset=1):
+        super().__init__(host, port, broadcast, keepalive, universe_hosts)
+        self.cid = uuid.uuid4().bytes
+        self.source_name = source_name.encode("utf-8")[:63].ljust(64, b"\x00")
+        self.priority = priority
+        self.universe_offset = universe_offset
+        if host is None:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+
+    def target(self, universe):
+        host = self.universe_hosts.get(universe, self.host)
+        if host is None:
+            u = universe + self.universe_offset
+            host = f"239.255.{(u >> 8) & 0xFF}.{u & 0xFF}"
+        return (host, self.port)
+
+    def next_sequence(self, universe):
+        seq = (self._sequence.get(universe, -1) + 1) % 256
+        self._sequence[universe] = seq
+        return seq
+
+    def build_packet(self, universe, data, sequence):
+        # Property values = start kód + kanály, což přesně odpovídá našemu bufferu
+        count = len(data)
+        total = 125 + count
+        root = (struct.pack(">HH", 0x0010, 0x0000)
+                + b"ASC-E1.17\x00\x00\x00"
+                + struct.pack(">HI", 0x7000 | (total - 16), 0x00000004)
+                + self.cid)
+        framing = (struct.pack(">HI", 0x7000 | (total - 38), 0x00000002)
+                   + self.source_name
+                   + struct.pack(">BHBBH", self.priority, 0, sequence, 0, universe + self.universe_offset))
+        dmp = struct.pack(">HBBHHH", 0x7000 | (total - 115), 0x02, 0xA1, 0x0000, 0x0001, count)
+        return root + framing + dmp + data
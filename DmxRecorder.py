@@ -0,0 +1,178 @@
+import mmap
+import struct
+import threading
+import time
+import numpy as np
+from DmxOutput import DMX_UNIVERSE_SIZE, OutputBackend
+
+
+# Formát souboru:
+#   hlavička  = magic, počet kanálů v universe, délka zapsaných dat
+#   záznam    = čas od začátku [s], universe, druh, počet + payload
+#   FULL      = celé universe (512 bajtů)
+#   DELTA     = počet x adresa (uint16) a pak počet x hodnota (uint8)
+MAGIC = b"DMXREC1\x00"
+HEADER = struct.Struct("<8sIQ")
+RECORD = struct.Struct("<dHBH")
+FULL = 0
+DELTA = 1
+
+
+class DmxRecorder(OutputBackend):
+    """
+    Nahrává odesílané DMX snímky do memory-mapped souboru.
+
+    Zapojuje se jako další výstup LightManageru, takže nahrává přesně to,
+    co jde na drát. Ukládají se jen změny proti minulému snímku universe;
+    celý snímek se zapíše na začátku a pak alespoň každých `keyframe_interval` s.
+    """
+    def __init__(self, filename, chunk_size=1 << 20, keyframe_interval=5.0):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.keyframe_interval = keyframe_interval
+        self.lock = threading.Lock()
+
+        self.file = open(filename, "w+b")
+        self.capacity = chunk_size
+        self.file.truncate(self.capacity)
+        self.mm = mmap.mmap(self.file.fileno(), self.capacity)
+        self.offset = HEADER.size
+        self._write_header()
+
+        self.start_time = time.monotonic()
+        self._last_frames = {}
+        self._last_keyframe = {}
+
+    def _write_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, DMX_UNIVERSE_SIZE, self.offset)
+
+    def _grow(self, needed):
+        self.mm.flush()
+        self.mm.close()
+        while self.capacity < needed:
+            self.capacity += self.chunk_size
+        self.file.truncate(self.capacity)
+        self.mm = mmap.mmap(self.file.fileno(), self.capacity)
+
+    def _append(self, record):
+        end = self.offset + len(record)
+        if end > self.capacity:
+            self._grow(end)
+        self.mm[self.offset:end] = record
+        self.offset = end
+        self._write_header()
+
+    def send(self, universe, data):
+        frame = np.frombuffer(data, dtype=np.uint8)
+        t = time.monotonic() - self.start_time
+
+        with self.lock:
+            if self.mm is None:
+                return False
+            last = self._last_frames.get(universe)
+            keyframe_due = t - self._last_keyframe.get(universe, -np.inf) >= self.keyframe_interval
+
+            if last is None or keyframe_due:
+                changed = None
+            else:
+                changed = np.flatnonzero(frame != last)
+                if len(changed) == 0:
+                    return False
+
+            if changed is None or 3 * len(changed) >= len(frame):
+                record = RECORD.pack(t, universe, FULL, len(frame)) + frame.tobytes()
+                self._last_keyframe[universe] = t
+            else:
+                record = (RECORD.pack(t, universe, DELTA, len(changed))
+                          + changed.astype("<u2").tobytes()
+                          + frame[changed].tobytes())
+            self._append(record)
+            self._last_frames[universe] = frame.copy()
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.mm is None:
+                return
+            self._write_header()
+            self.mm.flush()
+            self.mm.close()
+            self.mm = None
+            self.file.truncate(self.offset)
+            self.file.close()
+
+
+class DmxReplayer:
+    """Čte záznam DmxRecorderu a přehrává ho do libovolného výstupu."""
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.slots, self.end = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Soubor {filename} není záznam DMX.")
+
+    def records(self):
+        """Vrací postupně (čas, universe, snímek) se zrekonstruovanými snímky."""
+        frames = {}
+        offset = HEADER.size
+        while offset + RECORD.size <= self.end:
+            t, universe, kind, count = RECORD.unpack_from(self.mm, offset)
+            offset += RECORD.size
+            frame = frames.get(universe)
+            if frame is None:
+                frame = frames[universe] = np.zeros(self.slots, dtype=np.uint8)
+
+            if kind == FULL:
+                frame[:count] = np.frombuffer(self.mm, dtype=np.uint8, count=count, offset=offset)
+                offset += count
+            else:
+                addrs = np.frombuffer(self.mm, dtype="<u2", count=count, offset=offset)
+                offset += 2 * count
+                frame[addrs] = np.frombuffer(self.mm, dtype=np.uint8, count=count, offset=offset)
+                offset += count
+            yield t, universe, frame
+
+    def duration(self):
+        last = 0.0
+        for t, _, _ in self.records():
+            last = t
+        return last
+
+    def snapshot_at(self, at):
+        """Stav všech universe v čase `at` – pro porovnání dvou záznamů."""
+        state = {}
+        for t, universe, frame in self.records():
+            if t > at:
+                break
+            state[universe] = frame.copy()
+        return state
+
+    def play(self, output, speed=1.0, refresh=1.0, stop_event=None):
+        """
+        Přehraje záznam do výstupu v původním tempu (speed=1.0) nebo
+        zrychleně/zpomaleně. Při delších pauzách se poslední snímky
+        znovu odešlou nejpozději po `refresh` s, aby výstup nevypadl.
+        """
+        start = time.monotonic()
+        current = {}
+        for t, universe, frame in self.records():
+            due = start + t / speed
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                if remaining > refresh:
+                    time.sleep(refresh)
+                    for u, data in current.items():
+                        output.send(u, data)
+                else:
+                    time.sleep(remaining)
+            data = frame.tobytes()
+            current[universe] = data
+            output.send(universe, data)
+
+    def close(self):
+        self.mm.close()
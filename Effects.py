@@ -0,0 +1,194 @@
+import threading
+import numpy as np
+from Sequencer import TempoClock
+
+
+# Generátory: fáze (pole, v cyklech) -> hodnota 0..1 pro každý kanál.
+# `width` je střída u square/chase, `cycle` číslo cyklu pro random.
+def _sine(phase, width, cycle, index):
+    return 0.5 - 0.5 * np.cos(2 * np.pi * phase)
+
+
+def _saw(phase, width, cycle, index):
+    return phase % 1.0
+
+
+def _square(phase, width, cycle, index):
+    return ((phase % 1.0) < width).astype(np.float32)
+
+
+def _random(phase, width, cycle, index):
+    # Sample & hold: jedna pseudonáhodná hodnota na světlo a cyklus, bez stavu
+    x = np.sin(cycle * 12.9898 + index * 78.233) * 43758.5453
+    return x - np.floor(x)
+
+
+def _chase(phase, width, cycle, index):
+    # Úzký pulz, který díky rozprostření fáze přebíhá přes světla skupiny
+    return (1.0 - (phase % 1.0) / width).clip(0.0, 1.0) * ((phase % 1.0) < width)
+
+
+GENERATORS = {
+    "sine": _sine,
+    "saw": _saw,
+    "square": _square,
+    "random": _random,
+    "chase": _chase,
+}
+
+BLENDS = ("max", "add", "multiply", "replace")
+
+
+class Effect:
+    """
+    Jeden efekt nad polem kanálů. Fáze kanálu = čas * rychlost + offset
+    + spread * (pořadí světla / počet světel); hodnota = low..high podle
+    generátoru, velikost lze modulovat audio příznakem (`modulate`).
+    """
+    def __init__(self, name, channels, fixture_index, generator="sine", rate=1.0, beats=None,
+                 low=0, high=255, spread=1.0, offset=0.0, width=0.5, size=1.0,
+                 modulate=None, depth=1.0, blend="max"):
+        if generator not in GENERATORS:
+            raise ValueError(f"Neznámý generátor efektu '{generator}'.")
+        if blend not in BLENDS:
+            raise ValueError(f"Neznámé skládání efektu '{blend}'.")
+        self.name = name
+        self.channels = np.asarray(channels, dtype=np.intp)
+        self.index = np.asarray(fixture_index, dtype=np.float64)
+        count = max(1.0, float(self.index.max()) + 1 if len(self.index) else 1.0)
+        self.phase_offset = offset + spread * self.index / count
+        self.generator = GENERATORS[generator]
+        self.rate = rate          # cyklů za sekundu
+        self.beats = beats        # nebo délka cyklu v beatech (přebíjí rate)
+        self.low = low
+        self.high = high
+        self.width = max(1e-3, width)
+        self.size = size
+        self.modulate = modulate  # jméno audio příznaku 0..1 (level, beat...)
+        self.depth = depth
+        self.blend = blend
+
+    def evaluate(self, seconds, beat, features):
+        cycles = beat / self.beats if self.beats else seconds * self.rate
+        phase = cycles + self.phase_offset
+        wave = self.generator(phase, self.width, np.floor(phase), self.index)
+        size = self.size
+        if self.modulate is not None:
+            size *= 1.0 - self.depth + self.depth * features.get(self.modulate, 0.0)
+        return self.low + (self.high - self.low) * wave * size
+
+
+# Efekty modulují nad scénami, vektorem i chase; stmívače jsou HTP, takže
+# s nižší prioritou by nízké hodnoty sinu/obdélníku nikdy nezhasly
+EFFECT_PRIORITY = 20
+
+
+class EffectEngine:
+    """
+    Generátor efektů jako procesor DMXControlleru. Všechny efekty se za
+    snímek vyhodnotí jako výrazy nad poli kanálů, složí do jednoho
+    bufferu a zapíšou do vrstvy jediným zápisem.
+    """
+    def __init__(self, scene_manager, layer="effects", priority=EFFECT_PRIORITY, clock=None):
+        self.scene_manager = scene_manager
+        self.dmx = scene_manager.light_plot.dmx
+        self.layer = self.dmx.layer(layer, priority)
+        self.clock = clock or TempoClock()
+        self.effects = {}
+        self.features = {}
+        self.start_time = None
+        self.lock = threading.Lock()
+        self._buffer = np.zeros(self.layer.size, dtype=np.float32)
+        self._touched = np.zeros(0, dtype=np.intp)
+        self.dmx.add_processor(self)
+
+    def group_channels(self, group, params=("dim",)):
+        """Kanály parametrů skupiny a pořadí světla pro každý kanál."""
+        group = self.scene_manager.get_group(group)
+        channels, index = [], []
+        for param in params:
+            c = group.param_channels(param) if group is not None else np.zeros(0, dtype=np.intp)
+            channels.append(c)
+            index.append(np.arange(len(c)))
+        return np.concatenate(channels).astype(np.intp), np.concatenate(index)
+
+    def add(self, name, group=None, params=("dim",), channels=None, **kwargs):
+        """Přidá (nebo nahradí) efekt na skupinu nebo přímo na ploché kanály."""
+        if channels is None:
+            channels, index = self.group_channels(group, params)
+        else:
+            channels = np.asarray(channels, dtype=np.intp)
+            index = np.arange(len(channels))
+        effect = Effect(name, channels, index, **kwargs)
+        with self.lock:
+            old = self.effects.get(name)
+            self.effects = {**self.effects, name: effect}
+            self._update_touched()
+        if old is not None:
+            self._release_unused(old.channels)
+        return effect
+
+    def remove(self, name):
+        with self.lock:
+            effect = self.effects.get(name)
+            if effect is None:
+                return False
+            self.effects = {n: e for n, e in self.effects.items() if n != name}
+            self._update_touched()
+        self._release_unused(effect.channels)
+        return True
+
+    def clear(self):
+        for name in list(self.effects):
+            self.remove(name)
+
+    def _update_touched(self):
+        channels = [e.channels for e in self.effects.values()]
+        self._touched = np.unique(np.concatenate(channels)) if channels else np.zeros(0, dtype=np.intp)
+
+    def _release_unused(self, channels):
+        used = [e.channels for e in self.effects.values()]
+        if used:
+            channels = np.setdiff1d(channels, np.concatenate(used))
+        self.layer.release(channels)
+
+    def set_features(self, **features):
+        """Audio příznaky pro modulaci, hodnoty 0..1 (např. level=0.7, beat=1)."""
+        self.features = {**self.features, **features}
+
+    def update_from_state(self, state):
+        """Převede AudioState na příznaky: level z dB (-60..0), beat 0/1."""
+        db = state.db if np.isfinite(state.db) else -60.0
+        self.set_features(level=float(np.clip((db + 60.0) / 60.0, 0.0, 1.0)),
+                          beat=1.0 if state.beat_on_off else 0.0)
+        self.clock.sync_state(state)
+
+    def tick(self, now):
+        with self.lock:
+            effects, touched = self.effects, self._touched
+        if not effects:
+            return
+        if self.start_time is None:
+            self.start_time = now
+        seconds = now - self.start_time
+        beat = self.clock.beat_at(now)
+
+        if len(self._buffer) < self.layer.size:
+            self._buffer = np.zeros(self.layer.size, dtype=np.float32)
+        out = self._buffer
+        out[touched] = 0.0
+        for effect in effects.values():
+            values = effect.evaluate(seconds, beat, self.features)
+            if effect.blend == "max":
+                out[effect.channels] = np.maximum(out[effect.channels], values)
+            elif effect.blend == "add":
+                out[effect.channels] += values
+            elif effect.blend == "multiply":
+                out[effect.channels] *= values / 255.0
+            else:
+                out[effect.channels] = values
+        self.layer.write(touched, np.rint(out[touched]))
+
+    def close(self):
+        self.clear()
+        self.dmx.remove_processor(self)
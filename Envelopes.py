@@ -0,0 +1,113 @@
+import threading
+import time
+import numpy as np
+
+
+class EnvelopeEngine:
+    """
+    Pulzy na beat jako obálky attack/hold/release, procesor DMXControlleru.
+
+    Obálka je jen čas spuštění a parametry na kanál; hodnota se za snímek
+    spočítá z `now - start` pro všechny běžící kanály najednou. Vrstva
+    pulzů je HTP nad stmívači, takže po doběhnutí obálky kanál uvolní
+    a světlo se vrátí na úroveň ostatních vrstev.
+
+    Nový trigger během běžící obálky začne attack z aktuální hodnoty
+    (bez propadu). `latency` je zpoždění výstupu – trigger s časem beatu
+    (`at`) se posune dopředu tak, aby vrchol dorazil na drát s beatem.
+    """
+    def __init__(self, dmx, layer="pulse", priority=None, latency=0.0):
+        self.dmx = dmx
+        self.layer = dmx.layer(layer, priority)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self._last_at = {}
+        self._allocate(self.layer.size)
+        dmx.add_processor(self)
+
+    def _allocate(self, size):
+        self.start = np.full(size, np.inf)
+        self.origin = np.zeros(size, dtype=np.float32)   # hodnota, ze které attack začíná
+        self.peak = np.zeros(size, dtype=np.float32)
+        self.attack = np.zeros(size, dtype=np.float32)
+        self.hold = np.zeros(size, dtype=np.float32)
+        self.release = np.zeros(size, dtype=np.float32)
+        self.running = np.zeros(size, dtype=bool)
+
+    _arrays = ("start", "origin", "peak", "attack", "hold", "release", "running")
+
+    def _grow(self):
+        size = self.layer.size
+        if size <= len(self.start):
+            return
+        old = [getattr(self, attr) for attr in self._arrays]
+        self._allocate(size)
+        for attr, prev in zip(self._arrays, old):
+            getattr(self, attr)[:len(prev)] = prev
+
+    def _evaluate(self, channels, now):
+        t = now - self.start[channels]
+        attack = self.attack[channels]
+        hold_end = attack + self.hold[channels]
+        release = self.release[channels]
+        origin = self.origin[channels]
+        peak = self.peak[channels]
+        rising = origin + (peak - origin) * np.clip(t / np.maximum(attack, 1e-6), 0.0, 1.0)
+        falling = peak * np.clip(1.0 - (t - hold_end) / np.maximum(release, 1e-6), 0.0, 1.0)
+        values = np.select([t < 0, t < attack, t < hold_end], [origin, rising, peak], falling)
+        done = t >= hold_end + release
+        return values, done
+
+    def trigger(self, channels, intensity=255, attack=0.02, hold=0.2, release=0.25, at=None, key=None):
+        """
+        Spustí obálku na kanálech. `at` je čas beatu (time.monotonic());
+        stejné `at` se stejným `key` se spustí jen jednou, takže volání
+        s každým snímkem, dokud trvá beat_on_off, obálku nerestartuje.
+        """
+        channels = np.asarray(channels, dtype=np.intp)
+        if len(channels) == 0:
+            return
+        if at is not None and key is not None:
+            if self._last_at.get(key) == at:
+                return
+            self._last_at[key] = at
+        now = time.monotonic()
+        start = now if at is None else at - self.latency - attack
+
+        with self.lock:
+            self._grow()
+            running = channels[self.running[channels]]
+            origin = np.zeros(len(channels), dtype=np.float32)
+            if len(running):
+                current, done = self._evaluate(running, start)
+                origin[self.running[channels]] = np.where(done, 0.0, current)
+            self.start[channels] = start
+            self.origin[channels] = origin
+            self.peak[channels] = intensity
+            self.attack[channels] = attack
+            self.hold[channels] = hold
+            self.release[channels] = release
+            self.running[channels] = True
+
+    def tick(self, now):
+        with self.lock:
+            channels = np.flatnonzero(self.running)
+            if len(channels) == 0:
+                return
+            values, done = self._evaluate(channels, now)
+            self.running[channels[done]] = False
+        live = channels[~done]
+        if len(live):
+            self.layer.write(live, np.rint(values[~done]))
+        if done.any():
+            self.layer.release(channels[done])
+
+    def clear(self):
+        with self.lock:
+            channels = np.flatnonzero(self.running)
+            self.running[:] = False
+        self.layer.release(channels)
+
+    def close(self):
+        self.clear()
+        self.dmx.remove_processor(self)
@@ -0,0 +1,180 @@
+import time
+import numpy as np
+from ColorPipeline import COLOR_PARAMS
+
+
+# Audio příznaky AudioState převedené na čísla; skalární pravidla dostávají
+# tóny a kód akordu přepočtené na 0..1, ostatní příznaky oříznuté na 0..1
+FEATURES = ("level", "beat", "bpm", "tone0", "tone1", "tone2", "chord")
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+CHORD_CODES = 9  # nejvyšší kód akordu z DecomposeNMF (0 = nerozpoznaný)
+
+TRANSFER_CURVES = (
+    ("linear", lambda x: x),
+    ("square", lambda x: x * x),
+    ("sqrt", np.sqrt),
+    ("smooth", lambda x: x * x * (3.0 - 2.0 * x)),
+)
+TRANSFER_IDS = {name: i for i, (name, _) in enumerate(TRANSFER_CURVES)}
+
+# Chování VectorClass před zavedením pravidel – použije se pro režimy bez "rules"
+DEFAULT_RULES = [
+    {"feature": "tone0", "group": ["bass", "midA"], "param": "color", "smoothing": 0.15},
+    {"feature": "tone1", "group": "midB", "param": "color", "smoothing": 0.15},
+    {"feature": "tone2", "group": "midC", "param": "color", "smoothing": 0.15},
+]
+DEFAULT_ON_BEAT = [
+    {"action": "alternate", "group": "strip", "intensity": 200},
+    {"action": "pulse", "group": "bass", "intensity": 255, "duration": 0.2},
+    {"action": "dim", "group": "bass", "value": 128},
+]
+
+
+def state_features(state):
+    """AudioState -> surové hodnoty příznaků (tóny jako čísla 0..12, akord jako kód 0..9)."""
+    db = state.db if np.isfinite(state.db) else -60.0
+    freqs = tuple(state.freqs)[:3] + (0,) * (3 - len(tuple(state.freqs)[:3]))
+    try:
+        chord = float(state.chord)
+    except (TypeError, ValueError):
+        chord = 0.0
+    return np.array([np.clip((db + 60.0) / 60.0, 0.0, 1.0),
+                     1.0 if state.beat_on_off else 0.0,
+                     state.bpm / 200.0,
+                     *freqs,
+                     chord], dtype=np.float64)
+
+
+class FeatureMapping:
+    """
+    Pravidla příznak -> parametr skupiny z modes.json zkompilovaná do polí.
+
+    Skalární pravidlo:
+        {"feature": "level", "group": "strip", "param": "dim",
+         "scale": [0, 255], "curve": "square", "threshold": 0.1, "smoothing": 0.2}
+    Barevné pravidlo (barva tónu z palety režimu):
+        {"feature": "tone0", "group": ["bass", "midA"], "param": "color", "smoothing": 0.1}
+
+    Skalární pravidla pracují s příznakem v 0..1: tón se přepočte z třídy
+    1..12, akord z kódu 0..9, úroveň, beat a bpm se jen oříznou.
+    Za snímek se všechna pravidla vyhodnotí najednou (práh, křivka,
+    měřítko, exponenciální vyhlazení s časovou konstantou `smoothing` s)
+    a výsledek jde do vrstvy jedním zápisem. Akce na beat ("on_beat")
+    jsou události a spouští se jen na náběžné hraně beatu.
+    """
+    def __init__(self, scene_manager, rules=None, on_beat=None):
+        self.scene = scene_manager
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.on_beat = DEFAULT_ON_BEAT if on_beat is None else on_beat
+        self.palette = np.zeros((12, len(COLOR_PARAMS)), dtype=np.float32)
+        self._last_time = None
+        self._last_beat = False
+        self._switch_state = False
+        self._version = None
+        self.compile()
+
+    def compile(self):
+        self._version = self.scene.light_plot.version
+        scalar, color = [], []
+        for rule in self.rules:
+            groups = rule["group"] if isinstance(rule["group"], list) else [rule["group"]]
+            feature = FEATURE_INDEX[rule["feature"]]
+            smoothing = rule.get("smoothing", 0.0)
+            for group_name in groups:
+                group = self.scene.get_group(group_name)
+                if group is None:
+                    continue
+                if rule.get("param", "dim") == "color":
+                    if len(group.color_channels):
+                        color.append((feature, smoothing, group.color_channels, group.color_weights))
+                    continue
+                channels = group.param_channels(rule.get("param", "dim"))
+                if len(channels) == 0:
+                    continue
+                low, high = rule.get("scale", (0, 255))
+                curve = rule.get("curve", "linear")
+                if curve not in TRANSFER_IDS:
+                    raise ValueError(f"Neznámá přenosová křivka '{curve}'.")
+                scalar.append((feature, low, high, rule.get("threshold", 0.0),
+                               TRANSFER_IDS[curve], smoothing, channels))
+
+        self.s_feature = np.array([r[0] for r in scalar], dtype=np.intp)
+        self.s_low = np.array([r[1] for r in scalar], dtype=np.float64)
+        self.s_high = np.array([r[2] for r in scalar], dtype=np.float64)
+        self.s_threshold = np.array([r[3] for r in scalar], dtype=np.float64)
+        self.s_curve = np.array([r[4] for r in scalar], dtype=np.intp)
+        self.s_tau = np.array([r[5] for r in scalar], dtype=np.float64)
+        self.s_state = np.full(len(scalar), np.nan)
+        self.s_channels = np.concatenate([r[6] for r in scalar]) if scalar else np.zeros(0, dtype=np.intp)
+        self.s_owner = (np.concatenate([np.full(len(r[6]), i) for i, r in enumerate(scalar)])
+                        if scalar else np.zeros(0, dtype=np.intp))
+
+        self.c_feature = np.array([r[0] for r in color], dtype=np.intp)
+        self.c_tau = np.array([r[1] for r in color], dtype=np.float64)
+        self.c_state = np.full((len(color), len(COLOR_PARAMS)), np.nan)
+        self.c_channels = np.concatenate([r[2] for r in color]) if color else np.zeros(0, dtype=np.intp)
+        self.c_weights = (np.concatenate([r[3] for r in color]) if color
+                          else np.zeros((0, len(COLOR_PARAMS))))
+        self.c_owner = (np.concatenate([np.full(len(r[2]), i) for i, r in enumerate(color)])
+                        if color else np.zeros(0, dtype=np.intp))
+
+        self.channels = np.concatenate([self.s_channels, self.c_channels]).astype(np.intp)
+
+    @staticmethod
+    def _smooth(state, target, tau, dt):
+        alpha = np.where(tau > 0, 1.0 - np.exp(-dt / np.maximum(tau, 1e-6)), 1.0)
+        if state.ndim > 1:
+            alpha = alpha[:, None]
+        fresh = np.isnan(state)
+        return np.where(fresh, target, state + (target - state) * alpha)
+
+    def evaluate(self, state, now=None):
+        """Vyhodnotí všechna pravidla pro jeden AudioState a zapíše do vrstvy."""
+        if self._version != self.scene.light_plot.version:
+            self.compile()
+        now = time.monotonic() if now is None else now
+        dt = 0.0 if self._last_time is None else now - self._last_time
+        self._last_time = now
+        raw = state_features(state)
+
+        if state.beat_on_off and not self._last_beat:
+            self.fire_beat(state)
+        self._last_beat = state.beat_on_off
+
+        if len(self.channels) == 0:
+            return
+        values = []
+        if len(self.s_feature):
+            x = raw[self.s_feature]
+            tones = (self.s_feature >= FEATURE_INDEX["tone0"]) & (self.s_feature <= FEATURE_INDEX["tone2"])
+            x = np.where(tones, (x % 12) / 11.0, x)
+            x = np.where(self.s_feature == FEATURE_INDEX["chord"], x / CHORD_CODES, x)
+            x = np.clip((x - self.s_threshold) / np.maximum(1.0 - self.s_threshold, 1e-6), 0.0, 1.0)
+            shaped = x.copy()
+            for cid in np.unique(self.s_curve):
+                mask = self.s_curve == cid
+                shaped[mask] = TRANSFER_CURVES[cid][1](x[mask])
+            target = self.s_low + (self.s_high - self.s_low) * shaped
+            self.s_state = self._smooth(self.s_state, target, self.s_tau, dt)
+            values.append(self.s_state[self.s_owner])
+        if len(self.c_feature):
+            colors = self.palette[raw[self.c_feature].astype(np.intp) % 12]
+            self.c_state = self._smooth(self.c_state, colors, self.c_tau, dt)
+            values.append(np.einsum("ij,ij->i", self.c_weights, self.c_state[self.c_owner]))
+        self.scene.commands.write(self.channels, np.rint(np.clip(np.concatenate(values), 0, 255)))
+
+    def fire_beat(self, state):
+        self._switch_state = not self._switch_state
+        for action in self.on_beat:
+            kind = action["action"]
+            if kind == "pulse":
+                self.scene.pulse_on_beat(action["group"], intensity=action.get("intensity", 255),
+                                         duration=action.get("duration", 0.2),
+                                         at=state.beat_time or None)
+            elif kind == "alternate":
+                self.scene.alternating_light_strip(action["group"], state=self._switch_state,
+                                                   intensity=action.get("intensity", 255))
+            elif kind == "dim":
+                self.scene.set_dim_for_group(action["group"], action.get("value", 255))
+            else:
+                raise ValueError(f"Neznámá akce na beat '{kind}'.")
@@ -0,0 +1,190 @@
+import json
+import os
+import numpy as np
+from DmxOutput import DMX_UNIVERSE_SIZE
+
+
+CAPABILITY_PARAMS = {
+    "dim": ("dim",),
+    "color": ("r", "g", "b", "w", "uv"),
+    "position": ("pan", "tilt"),
+    "speed": ("speed",),
+    "zoom": ("zoom",),
+    "strobe": ("strobo",),
+    "haze": ("haze", "fan"),
+}
+
+# 16bitové dvojice starších řádků s vlastními offsety (hrubý -> jemný kanál)
+DEFAULT_FINE = {"pan": "panF", "tilt": "tiltF"}
+
+
+class FixtureProfile:
+    """
+    Model světla definovaný jednou: rozložení kanálů (offsety od 1),
+    schopnosti, 16bitové dvojice (hrubý -> jemný kanál), křivka stmívače
+    (linear/square/gamma), bílý bod (zesílení r, g, b) a převod RGB -> RGBW.
+    """
+    __slots__ = ("name", "type", "channels", "capabilities", "fine", "dimmer_curve", "gamma",
+                 "white_point", "rgb_to_w", "anonymous")
+
+    def __init__(self, name, type, channels, capabilities=None, fine=None, dimmer_curve="linear",
+                 gamma=2.2, white_point=None, rgb_to_w=False, anonymous=False):
+        self.name = name
+        self.type = type
+        self.channels = {p: o for p, o in channels.items()
+                         if isinstance(o, int) and not isinstance(o, bool) and o > 0}
+        if capabilities is None:
+            capabilities = [cap for cap, params in CAPABILITY_PARAMS.items()
+                            if any(p in self.channels for p in params)]
+        self.capabilities = tuple(capabilities)
+        self.fine = {coarse: f for coarse, f in (fine or {}).items()
+                     if coarse in self.channels and f in self.channels}
+        self.dimmer_curve = dimmer_curve
+        self.gamma = gamma
+        self.white_point = tuple(white_point) if white_point else None
+        self.rgb_to_w = rgb_to_w and all(p in self.channels for p in ("r", "g", "b", "w"))
+        self.anonymous = anonymous
+
+    def layout_key(self):
+        return (self.type, tuple(sorted(self.channels.items())))
+
+
+class ProfileLibrary:
+    """
+    Registr profilů načtený jednou z config/profiles.json. Světla v plotu
+    na profil odkazují jménem; starší řádky s vlastními offsety dostanou
+    anonymní profil sdílený všemi světly se stejným rozložením.
+    """
+    def __init__(self):
+        self.profiles = {}
+        self._layouts = {}
+
+    def load(self, filename):
+        if not filename or not os.path.exists(filename):
+            return
+        with open(filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for name, spec in data.items():
+            self.add(FixtureProfile(
+                name, spec["type"], spec["channels"],
+                capabilities=spec.get("capabilities"),
+                fine=spec.get("fine"),
+                dimmer_curve=spec.get("dimmer_curve", "linear"),
+                gamma=spec.get("gamma", 2.2),
+                white_point=spec.get("white_point"),
+                rgb_to_w=spec.get("rgb_to_w", False),
+            ))
+
+    def add(self, profile):
+        self.profiles[profile.name] = profile
+        self._layouts.setdefault(profile.layout_key(), profile)
+        return profile
+
+    def get(self, name):
+        profile = self.profiles.get(name)
+        if profile is None:
+            raise KeyError(f"Profil světla '{name}' neexistuje.")
+        return profile
+
+    def intern(self, light_type, offsets):
+        """Profil pro vložené offsety – stejné rozložení sdílí jeden objekt."""
+        candidate = FixtureProfile(f"_{light_type}_{len(self._layouts)}", light_type, offsets,
+                                   fine=DEFAULT_FINE, anonymous=True)
+        profile = self._layouts.get(candidate.layout_key())
+        if profile is None:
+            profile = self._layouts[candidate.layout_key()] = candidate
+        return profile
+
+
+class FixturePatch:
+    """
+    Patch tabulka všech světel: řádek = světlo, sloupec = parametr,
+    hodnota = plochá DMX adresa (universe * 512 + adresa), -1 = parametr chybí.
+
+    Světla si drží jen číslo svého řádku, takže skupinové zápisy jsou
+    jedno indexování do pole místo průchodu slovníky jednotlivých světel.
+    """
+    def __init__(self, capacity=64):
+        self.profiles = ProfileLibrary()
+        self._profile_columns = {}
+        self.params = []
+        self.param_index = {}
+        self.table = np.full((capacity, 8), -1, dtype=np.int32)
+        self.bases = np.full(capacity, -1, dtype=np.int32)  # plochá adresa světla
+        self.rows = 0
+
+    def param_id(self, param):
+        pid = self.param_index.get(param)
+        if pid is None:
+            pid = self.param_index[param] = len(self.params)
+            self.params.append(param)
+            if pid >= self.table.shape[1]:
+                grown = np.full((self.table.shape[0], self.table.shape[1] * 2), -1, dtype=np.int32)
+                grown[:, :self.table.shape[1]] = self.table
+                self.table = grown
+        return pid
+
+    def add(self, universe, address, offsets):
+        """Zapíše světlo do patche; `offsets` jsou offsety parametrů od 1."""
+        if self.rows == self.table.shape[0]:
+            grown = np.full((self.rows * 2, self.table.shape[1]), -1, dtype=np.int32)
+            grown[:self.rows] = self.table
+            self.table = grown
+            bases = np.full(self.rows * 2, -1, dtype=np.int32)
+            bases[:self.rows] = self.bases
+            self.bases = bases
+
+        row = self.rows
+        self.rows += 1
+        base = universe * DMX_UNIVERSE_SIZE + address
+        self.bases[row] = base
+        for param, offset in offsets.items():
+            if isinstance(offset, int) and not isinstance(offset, bool) and offset > 0:
+                pid = self.param_id(param)
+                self.table[row, pid] = base + offset - 1
+        return row
+
+    def add_profile(self, universe, address, profile):
+        """Zapíše světlo podle profilu jedním vektorovým zápisem do řádku."""
+        columns = self._profile_columns.get(id(profile))
+        if columns is None:
+            pids = np.array([self.param_id(p) for p in profile.channels], dtype=np.intp)
+            offsets = np.array(list(profile.channels.values()), dtype=np.int32) - 1
+            columns = self._profile_columns[id(profile)] = (pids, offsets)
+        row = self.add(universe, address, {})
+        pids, offsets = columns
+        self.table[row, pids] = self.bases[row] + offsets
+        return row
+
+    def remove(self, row):
+        self.table[row] = -1
+        self.bases[row] = -1
+
+    def channel(self, row, param):
+        pid = self.param_index.get(param)
+        if pid is None:
+            return -1
+        return int(self.table[row, pid])
+
+    def row_channels(self, row):
+        """Parametr -> adresa v rámci universe (kompatibilní s dřívějším Light.channels)."""
+        result = {}
+        for pid in np.flatnonzero(self.table[row, :len(self.params)] >= 0):
+            result[self.params[pid]] = int(self.table[row, pid]) % DMX_UNIVERSE_SIZE
+        return result
+
+    def row_offsets(self, row):
+        base = self.bases[row]
+        return {self.params[pid]: int(self.table[row, pid] - base) + 1
+                for pid in np.flatnonzero(self.table[row, :len(self.params)] >= 0)}
+
+    def channels(self, rows, param):
+        """Ploché adresy parametru pro zadané řádky (světla bez parametru vynechá)."""
+        pid = self.param_index.get(param)
+        if pid is None:
+            return np.zeros(0, dtype=np.intp)
+        column = self.table[np.asarray(rows, dtype=np.intp), pid]
+        return column[column >= 0].astype(np.intp)
+
+    def all_channels(self, param):
+        return self.channels(np.arange(self.rows), param)
@@ -0,0 +1,113 @@
+import json
+import math
+import time
+import numpy as np
+
+
+# Logaritmické koše 0.1 ms .. ~13 s, 8 košů na oktávu (krok ~9 %)
+BUCKET_MIN = 1e-4
+BUCKETS_PER_OCTAVE = 8
+BUCKET_COUNT = 17 * BUCKETS_PER_OCTAVE
+BUCKET_EDGES = BUCKET_MIN * 2.0 ** (np.arange(BUCKET_COUNT + 1) / BUCKETS_PER_OCTAVE)
+
+# Pořadí stupňů od zachycení audia po drát – každý měří čas od zachycení bloku
+STAGES = ("source", "beat", "nmf", "vector", "frame", "wire")
+
+
+class LatencyHistogram:
+    """Histogram latencí s pevnými logaritmickými koši – zápis je O(1) bez alokace."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (BUCKET_COUNT + 2)  # + podtečení/přetečení; seznam kvůli rychlosti +=
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds < BUCKET_MIN:
+            index = 0
+        else:
+            index = min(int(math.log2(seconds / BUCKET_MIN) * BUCKETS_PER_OCTAVE) + 1, BUCKET_COUNT + 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Horní hrana koše, do kterého padne q-tý percentil (v sekundách)."""
+        if self.count == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), self.count * q / 100.0))
+        if index == 0:
+            return BUCKET_MIN
+        if index > BUCKET_COUNT:
+            return self.max
+        return float(min(BUCKET_EDGES[index], self.max))
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": float(1000.0 * self.total / self.count) if self.count else 0.0,
+            "p50_ms": 1000.0 * self.percentile(50),
+            "p95_ms": 1000.0 * self.percentile(95),
+            "p99_ms": 1000.0 * self.percentile(99),
+            "max_ms": float(1000.0 * self.max),
+        }
+
+
+class LatencyTracer:
+    """
+    Latence jednotlivých stupňů od zachycení audio bloku:
+        source  blok převzatý AudioPipeline ze zdroje
+        beat    výsledek beat analýzy v AudioState
+        nmf     tóny/akord z DecomposeNMF v AudioState
+        vector  zápis VectorClass do vrstvy
+        frame   render snímku, který změnu obsahuje
+        wire    snímek odeslaný všemi výstupy
+    Časy jsou time.monotonic(). Zápis není zamčený – každý stupeň
+    zapisuje jen jedno vlákno runtime.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.enabled = True
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram()
+        hist.record(seconds)
+
+    def since(self, stage, capture_time, now=None):
+        """Zaznamená čas od zachycení `capture_time` do teď."""
+        if capture_time:
+            self.record(stage, (time.monotonic() if now is None else now) - capture_time)
+
+    def reset(self):
+        self.stages.clear()
+
+    def summary(self):
+        order = [s for s in STAGES if s in self.stages] + sorted(set(self.stages) - set(STAGES))
+        return {stage: self.stages[stage].summary() for stage in order}
+
+    def report(self):
+        """Tabulka pro výpis (ms od zachycení audia)."""
+        lines = [f"{'stupeň':<8}{'počet':>8}{'průměr':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<8}{s['count']:>8}{s['mean_ms']:>9.1f}{s['p50_ms']:>9.1f}"
+                         f"{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}")
+        return "\n".join(lines)
+
+    def dump(self, filename=None):
+        """Vypíše tabulku; s `filename` navíc uloží souhrn jako JSON."""
+        print(self.report())
+        if filename:
+            with open(filename, "w", encoding="utf-8") as f:
+                json.dump(self.summary(), f, indent=4)
+
+
+# Sdílený tracer procesu
+tracer = LatencyTracer()
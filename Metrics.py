@@ -0,0 +1,209 @@
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Výchozí koše histogramů pro doby běhu (sekundy)
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format(value):
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(int(value)) if value.is_integer() else repr(value)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    """Monotónně rostoucí počet; s `fn` se čte z existujícího počítadla objektu."""
+    __slots__ = ("value", "fn")
+    kind = "counter"
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name + _label_text(labels), self.fn() if self.fn is not None else self.value
+
+
+class Gauge:
+    """Okamžitá hodnota; s `fn` se čte až při exportu (délka fronty, BPM...)."""
+    __slots__ = ("value", "fn")
+    kind = "gauge"
+
+    def __init__(self, fn=None):
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name + _label_text(labels), self.fn() if self.fn is not None else self.value
+
+
+class Histogram:
+    """Rozložení hodnot v pevných koších (Prometheus `le`, kumulativně při exportu)."""
+    __slots__ = ("buckets", "counts", "count", "sum")
+    kind = "histogram"
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def time(self):
+        """Kontext, který změří dobu bloku: `with hist.time(): ...`"""
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for edge, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield name + "_bucket" + _label_text(labels + (("le", edge),)), cumulative
+        yield name + "_sum" + _label_text(labels), self.sum
+        yield name + "_count" + _label_text(labels), self.count
+
+
+class _Timer:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Registr metrik procesu. Metriky se vytváří jednou (typicky
+    v __init__ měřené třídy) a zápis je pak jen přičtení do atributu
+    bez zámku – zapisuje vždy jedno vlákno, export jen čte.
+
+        frames = registry.counter("dmx_frames_total", "Odeslané snímky", universe=0)
+        frames.inc()
+
+    Export je textový formát Prometheus (`render`) nebo JSON (`as_dict`),
+    `serve` je vystaví na lokálním HTTP (/metrics, /metrics.json).
+    """
+    def __init__(self):
+        self.metrics = {}   # jméno -> (typ, popis, {labels: metrika})
+        self.lock = threading.Lock()
+        self.server = None
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.metrics.get(name)
+            if family is None:
+                family = self.metrics[name] = (cls.kind, help_text, {})
+            elif family[0] != cls.kind:
+                raise ValueError(f"Metrika '{name}' už existuje jako {family[0]}.")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = cls(**kwargs)
+            return metric
+
+    def counter(self, name, help_text="", fn=None, **labels):
+        counter = self._get(Counter, name, help_text, labels)
+        if fn is not None:
+            counter.fn = fn
+        return counter
+
+    def gauge(self, name, help_text="", fn=None, **labels):
+        gauge = self._get(Gauge, name, help_text, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help_text="", buckets=TIME_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Všechny metriky v textovém formátu Prometheus."""
+        lines = []
+        with self.lock:
+            families = [(name, kind, help_text, list(series.items()))
+                        for name, (kind, help_text, series) in self.metrics.items()]
+        for name, kind, help_text, series in families:
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series:
+                for sample, value in metric.samples(name, labels):
+                    lines.append(f"{sample} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self):
+        with self.lock:
+            families = [(name, list(series.items())) for name, (_, _, series) in self.metrics.items()]
+        samples = {sample: value for name, series in families
+                   for labels, metric in series for sample, value in metric.samples(name, labels)}
+        # JSON nezná nekonečno – nekonečné hodnoty jdou jako text
+        return {sample: value if abs(float(value)) < float("inf") else _format(value)
+                for sample, value in samples.items()}
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """Spustí HTTP endpoint na pozadí (jen lokálně, pokud host nezměníš)."""
+        if self.server is not None:
+            return self.server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.render().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.as_dict()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metriky na http://{host}:{port}/metrics")
+        return self.server
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Sdílený registr procesu
+registry = MetricsRegistry()
@@ -0,0 +1,219 @@
+import threading
+import time
+import numpy as np
+from Sequencer import TempoClock
+
+
+FULL_RANGE = 65535
+COARSE_TO_16 = 257  # 8bitová hodnota 0..255 -> 16bitová 0..65535
+
+
+def _triangle(phase):
+    return 4.0 * np.abs(phase % 1.0 - 0.5) - 1.0
+
+
+# Tvar pohybu: fáze (v cyklech) -> odchylka pan/tilt v rozsahu -1..1
+SHAPES = (
+    ("none", lambda p: (np.zeros_like(p), np.zeros_like(p))),
+    ("circle", lambda p: (np.sin(2 * np.pi * p), np.cos(2 * np.pi * p))),
+    ("eight", lambda p: (np.sin(2 * np.pi * p), np.sin(4 * np.pi * p))),
+    ("sweep", lambda p: (_triangle(p), np.zeros_like(p))),
+    ("tilt_sweep", lambda p: (np.zeros_like(p), _triangle(p))),
+)
+SHAPE_IDS = {name: i for i, (name, _) in enumerate(SHAPES)}
+
+
+def split16(values):
+    """16bitové pozice -> (hrubý, jemný) kanál."""
+    values = np.clip(np.rint(values), 0, FULL_RANGE).astype(np.int64)
+    return values >> 8, values & 0xFF
+
+
+class MovementEngine:
+    """
+    Pohyb hlav v 16bitovém prostoru jako procesor DMXControlleru.
+
+    Každá hlava má střed pohybu (přejezd z/do s plynulým rozjezdem)
+    a volitelný tvar kolem něj (kruh, osmička, sweep) s fází v beatech
+    nebo sekundách. Za snímek se pozice všech hlav spočítají najednou
+    a rozdělí na hrubý a jemný kanál (jemné kanály podle `fine` profilu).
+    Do vrstvy se zapisují jen kanály, jejichž hodnota se změnila – stojící
+    hlava tak nepřebíjí LTP zápisy scén a chase, dokud se znovu nepohne.
+    """
+    def __init__(self, scene_manager, layer="movement", priority=None, clock=None):
+        self.scene_manager = scene_manager
+        self.light_plot = scene_manager.light_plot
+        self.dmx = self.light_plot.dmx
+        self.layer = self.dmx.layer(layer, priority)
+        self.clock = clock or TempoClock()
+        self.lock = threading.Lock()
+        self._version = None
+        self.rebuild()
+        self.dmx.add_processor(self)
+
+    def rebuild(self):
+        """Najde v patchi hlavy (světla s pan i tilt) a založí jejich stav."""
+        patch = self.dmx.patch
+        rows = np.arange(patch.rows)
+        pan = self._column(rows, "pan")
+        tilt = self._column(rows, "tilt")
+        heads = rows[(pan >= 0) & (tilt >= 0)]
+        by_row = {light.row: light for light in self.light_plot.lights}
+
+        with self.lock:
+            self.rows = heads
+            self.pan = pan[heads]
+            self.tilt = tilt[heads]
+            self.pan_fine = self._fine_column(heads, by_row, "pan")
+            self.tilt_fine = self._fine_column(heads, by_row, "tilt")
+            base = [(getattr(by_row.get(r), "base_pan", 127), getattr(by_row.get(r), "base_tilt", 127))
+                    for r in heads.tolist()]
+            self.base = np.array(base, dtype=np.float64).reshape(-1, 2) * COARSE_TO_16
+
+            n = len(heads)
+            self.active = np.zeros(n, dtype=bool)
+            self.move_source = self.base.copy()
+            self.move_target = self.base.copy()
+            self.move_start = np.zeros(n)
+            self.move_time = np.zeros(n)
+            self.shape = np.zeros(n, dtype=np.intp)
+            self.size = np.zeros((n, 2))
+            self.rate = np.zeros(n)
+            self.beats = np.zeros(n)     # > 0 = délka cyklu v beatech místo `rate`
+            self.phase = np.zeros(n)
+            self.positions = self.base.copy()
+            self.written = np.full((n, 4), -1, dtype=np.int64)   # naposledy zapsané pan, tilt, panF, tiltF
+            self._version = self.light_plot.version
+
+    def _column(self, rows, param):
+        patch = self.dmx.patch
+        pid = patch.param_index.get(param)
+        if pid is None:
+            return np.full(len(rows), -1, dtype=np.int64)
+        return patch.table[rows, pid].astype(np.int64)
+
+    def _fine_column(self, rows, by_row, axis):
+        """Adresy jemného kanálu osy podle `fine` profilu světla (-1 = bez jemného)."""
+        patch = self.dmx.patch
+        column = []
+        for row in rows.tolist():
+            profile = getattr(by_row.get(row), "profile", None)
+            fine = profile.fine.get(axis) if profile is not None else None
+            column.append(patch.channel(row, fine) if fine else -1)
+        return np.array(column, dtype=np.int64)
+
+    def heads(self, group=None):
+        """Indexy hlav ve stavu enginu (celá plot nebo jedna skupina)."""
+        if self._version != self.light_plot.version:
+            self.rebuild()
+        if group is None:
+            return np.arange(len(self.rows))
+        group = self.scene_manager.get_group(group)
+        if group is None:
+            return np.zeros(0, dtype=np.intp)
+        return np.flatnonzero(np.isin(self.rows, group.rows))
+
+    def _centers(self, now, index):
+        duration = self.move_time[index]
+        progress = np.where(duration > 0, np.clip((now - self.move_start[index]) / np.maximum(duration, 1e-9), 0, 1), 1.0)
+        eased = progress * progress * (3.0 - 2.0 * progress)
+        start = self.move_source[index]
+        return start + (self.move_target[index] - start) * eased[:, None]
+
+    def _start_move(self, index, targets, duration, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.move_source[index] = self._centers(now, index)
+            self.move_target[index] = targets
+            self.move_start[index] = now
+            self.move_time[index] = duration
+            self.active[index] = True
+            self.written[index] = -1
+
+    def move_to(self, group, pan, tilt, duration=1.0, fine=False):
+        """
+        Přejede skupinou na pozici; pan/tilt jsou 0..255 (smí být desetinné),
+        s `fine=True` přímo 16bitové 0..65535.
+        """
+        scale = 1 if fine else COARSE_TO_16
+        self._start_move(self.heads(group), (pan * scale, tilt * scale), duration)
+
+    def move_light(self, light, pan, tilt, duration=0.3):
+        index = np.flatnonzero(self.rows == light.row)
+        self._start_move(index, (pan * COARSE_TO_16, tilt * COARSE_TO_16), duration)
+
+    def home(self, group=None, duration=1.0):
+        """Návrat na base_pan/base_tilt z light plotu."""
+        index = self.heads(group)
+        self._start_move(index, self.base[index], duration)
+
+    def set_shape(self, group, shape="circle", size=(30, 20), rate=0.25, beats=None, spread=0.0):
+        """
+        Tvar kolem středu pohybu: `size` je amplituda pan/tilt v 0..255,
+        cyklus trvá `beats` beatů (synchronně s hudbou) nebo 1/`rate` sekund,
+        `spread` rozloží fázi přes hlavy skupiny (1.0 = celý cyklus).
+        """
+        if shape not in SHAPE_IDS:
+            raise ValueError(f"Neznámý tvar pohybu '{shape}'.")
+        index = self.heads(group)
+        with self.lock:
+            self.shape[index] = SHAPE_IDS[shape]
+            self.size[index] = np.asarray(size, dtype=np.float64) * COARSE_TO_16
+            self.rate[index] = rate
+            self.beats[index] = beats or 0.0
+            self.phase[index] = spread * np.arange(len(index)) / max(1, len(index))
+            self.active[index] = True
+            self.written[index] = -1
+
+    def stop_shape(self, group=None):
+        with self.lock:
+            self.shape[self.heads(group)] = 0
+
+    def release(self, group=None):
+        """Engine přestane řídit hlavy skupiny; pozice převezmou ostatní vrstvy."""
+        index = self.heads(group)
+        with self.lock:
+            self.active[index] = False
+            self.shape[index] = 0
+            self.written[index] = -1
+        channels = np.concatenate([self.pan[index], self.tilt[index],
+                                   self.pan_fine[index], self.tilt_fine[index]])
+        self.layer.release(channels[channels >= 0])
+
+    def tick(self, now):
+        if self._version != self.light_plot.version:
+            self.rebuild()
+        with self.lock:
+            index = np.flatnonzero(self.active)
+            if len(index) == 0:
+                return
+            positions = self._centers(now, index)
+
+            shapes = self.shape[index]
+            if shapes.any():
+                beat = self.clock.beat_at(now)
+                cycles = np.where(self.beats[index] > 0, beat / np.maximum(self.beats[index], 1e-9),
+                                  now * self.rate[index])
+                phase = cycles + self.phase[index]
+                offsets = np.zeros_like(positions)
+                for sid in np.unique(shapes[shapes > 0]):
+                    mask = shapes == sid
+                    dx, dy = SHAPES[sid][1](phase[mask])
+                    offsets[mask] = np.stack([dx, dy], axis=1) * self.size[index[mask]]
+                positions = positions + offsets
+            self.positions[index] = positions
+
+            coarse, fine = split16(positions)
+            values = np.column_stack([coarse, fine])
+            channels = np.column_stack([self.pan[index], self.tilt[index],
+                                        self.pan_fine[index], self.tilt_fine[index]])
+            # Jen změněné kanály – zápis do vrstvy obnovuje LTP razítko
+            changed = (values != self.written[index]) & (channels >= 0)
+            if not changed.any():
+                return
+            self.written[index] = values
+        self.layer.write(channels[changed], values[changed])
+
+    def close(self):
+        self.release()
+        self.dmx.remove_processor(self)
@@ -0,0 +1,87 @@
+import json
+import os
+import numpy as np
+
+
+PITCH_CLASSES = 12
+COLOR_CHANNELS = 5  # r, g, b, w, uv – kratší barvy se doplní nulami
+WHITE = (255, 255, 255)
+
+
+class PaletteBank:
+    """
+    Všechny režimy a palety načtené jednou do polí:
+        tones     (režim x 12 tónů x kanál)
+        defaults  (režim x skupina x kanál)
+    Výběr barvy tónu, přepnutí režimu i prolnutí palet je indexování.
+
+    Analyzátor vrací tóny 1..12 (midi % 12 + 1) a palety mají klíče
+    "0".."11"; tón se proto indexuje `p % 12` – tóny 1..11 zůstávají
+    na svých klíčích a tón 12 padne na "0", který jinak nikdo nepoužívá.
+    """
+    _loaded = {}
+
+    def __init__(self, files):
+        self.files = tuple(files)
+        self.names = []
+        self.groups = []
+        tones, defaults = [], []
+        raw_modes = []
+        for filename in self.files:
+            if not filename or not os.path.exists(filename):
+                continue
+            with open(filename, "r", encoding="utf-8") as f:
+                for name, config in json.load(f).items():
+                    if name in self.names:
+                        continue
+                    self.names.append(name)
+                    raw_modes.append(config)
+                    for group in config.get("default_colors", {}):
+                        if group not in self.groups:
+                            self.groups.append(group)
+
+        for config in raw_modes:
+            table = np.tile(self._color(WHITE), (PITCH_CLASSES, 1))
+            for key, color in config.get("tone_colors", {}).items():
+                table[int(key) % PITCH_CLASSES] = self._color(color)
+            tones.append(table)
+            default = config.get("default_colors", {})
+            defaults.append([self._color(default.get(group, WHITE)) for group in self.groups])
+
+        self.tones = np.array(tones, dtype=np.float32).reshape(-1, PITCH_CLASSES, COLOR_CHANNELS)
+        self.defaults = np.array(defaults, dtype=np.float32).reshape(-1, len(self.groups), COLOR_CHANNELS)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.configs = dict(zip(self.names, raw_modes))
+
+    @classmethod
+    def load(cls, *files):
+        """Sdílená banka pro danou sadu souborů (načte se jen poprvé)."""
+        bank = cls._loaded.get(files)
+        if bank is None:
+            bank = cls._loaded[files] = cls(files)
+        return bank
+
+    @staticmethod
+    def _color(color):
+        out = np.zeros(COLOR_CHANNELS, dtype=np.float32)
+        color = list(color)[:COLOR_CHANNELS]
+        out[:len(color)] = color
+        return out
+
+    def mode(self, name):
+        if name not in self.index:
+            raise ValueError(f"Režim '{name}' nebyl nalezen v konfiguračním souboru.")
+        return self.index[name]
+
+    def tone_colors(self, mode, pitches):
+        """Barvy pro tóny (pole tónů -> pole barev) v režimu `mode` (index)."""
+        return self.tones[mode, np.asarray(pitches, dtype=np.intp) % PITCH_CLASSES]
+
+    def default_color(self, mode, group):
+        if group not in self.groups:
+            return self._color(WHITE)
+        return self.defaults[mode, self.groups.index(group)]
+
+    def morph(self, mode_a, mode_b, amount):
+        """Paleta (12 x kanál) prolnutá z režimu a do režimu b (amount 0..1)."""
+        return self.tones[mode_a] + (self.tones[mode_b] - self.tones[mode_a]) * amount
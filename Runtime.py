@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from Metrics import registry
+
+
+class Task:
+    """Naplánovaná úloha runtime – periodická (`interval`) nebo jednorázová."""
+    __slots__ = ("name", "fn", "interval", "due", "blocking", "worker", "cancelled", "idle", "seconds", "skipped")
+
+    def __init__(self, name, fn, interval, due, blocking, worker=None):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.due = due
+        self.blocking = blocking
+        self.worker = worker
+        self.cancelled = False
+        self.idle = threading.Event()
+        self.idle.set()
+        self.seconds = registry.histogram("runtime_task_seconds", "Doba běhu úlohy runtime", task=name)
+        self.skipped = registry.counter("runtime_skipped_total", "Ticky přeskočené, protože úloha ještě běžela",
+                                        task=name)
+
+
+class Runtime:
+    """
+    Jeden plánovač pro všechny periodické úlohy a časovače (DMX snímky,
+    čtení audia, analýzy, odložené akce).
+
+    Krátké úlohy běží přímo ve vlákně plánovače. Úlohy s `blocking=True`
+    (čtení ze zdroje, NMF, librosa) jdou do malého poolu workerů; pokud
+    předchozí běh ještě neskončil, tick se přeskočí místo hromadění.
+    Úloha s `worker="jméno"` dostane vlastní vlákno, aby nečekala ve frontě
+    poolu za pomalými analýzami (beat).
+    Periodické úlohy drží rozvrh bez driftu (další termín = minulý + interval).
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Společný runtime procesu (vytvoří a spustí se při prvním použití)."""
+        with cls._shared_lock:
+            if cls._shared is None or cls._shared.stopped:
+                cls._shared = cls()
+                cls._shared.start()
+            return cls._shared
+
+    def __init__(self, workers=3):
+        self.workers = workers
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pool = None
+        self._workers = {}   # jméno -> vyhrazený jednovláknový executor
+        self.stopped = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="runtime-worker")
+            self._thread = threading.Thread(target=self._run, name="runtime", daemon=True)
+            self._thread.start()
+
+    def _schedule(self, task):
+        with self._cond:
+            heapq.heappush(self._heap, (task.due, next(self._order), task))
+            self._cond.notify()
+        return task
+
+    def every(self, interval, fn, name=None, blocking=False, delay=0.0, worker=None):
+        """Spouští `fn` každých `interval` sekund."""
+        return self._schedule(Task(name or fn.__name__, fn, interval, time.monotonic() + delay,
+                                   blocking or worker is not None, worker))
+
+    def after(self, delay, fn, name=None, blocking=False, worker=None):
+        """Spustí `fn` jednou za `delay` sekund."""
+        return self._schedule(Task(name or fn.__name__, fn, None, time.monotonic() + max(0.0, delay),
+                                   blocking or worker is not None, worker))
+
+    def _executor(self, worker):
+        if worker is None:
+            return self._pool
+        executor = self._workers.get(worker)
+        if executor is None:
+            executor = self._workers[worker] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"runtime-{worker}")
+        return executor
+
+    def submit(self, fn, *args):
+        return self._pool.submit(fn, *args)
+
+    def cancel(self, task, wait=True, timeout=5.0):
+        """Zruší úlohu; s `wait` počká, až doběhne její právě probíhající běh."""
+        if task is None:
+            return
+        task.cancelled = True
+        if wait and threading.current_thread() is not self._thread:
+            task.idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.stopped and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                if self.stopped:
+                    return
+                _, _, task = heapq.heappop(self._heap)
+
+            if task.cancelled:
+                continue
+            if task.blocking:
+                if task.idle.is_set():
+                    task.idle.clear()
+                    self._executor(task.worker).submit(self._execute, task)
+                else:
+                    task.skipped.inc()
+            else:
+                task.idle.clear()
+                self._execute(task)
+
+            if task.interval is not None and not task.cancelled:
+                now = time.monotonic()
+                task.due += task.interval
+                if task.due < now:
+                    task.due = now + task.interval
+                self._schedule(task)
+
+    @staticmethod
+    def _execute(task):
+        start = time.perf_counter()
+        try:
+            if not task.cancelled:
+                task.fn()
+        except Exception:
+            print(f"Chyba v úloze '{task.name}':")
+            traceback.print_exc()
+        finally:
+            task.seconds.observe(time.perf_counter() - start)
+            task.idle.set()
+
+    def stop(self):
+        """Zastaví plánovač a počká na doběhnutí úloh v poolu."""
+        with self._cond:
+            self.stopped = True
+            tasks = [task for _, _, task in self._heap]
+            self._heap.clear()
+            self._cond.notify()
+        for task in tasks:
+            task.cancelled = True
+        if self._thread is not None and threading.current_thread() is not self._thread:
+            self._thread.join()
+        for executor in [self._pool, *self._workers.values()]:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,200 @@
+import json
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from DmxOutput import DMX_UNIVERSE_SIZE
+
+
+# Soubor = hlavička + záznamy připisované na konec (append-only log).
+#   záznam = crc32, druh, délka jména, počet universe, počet kanálů
+#            + jméno (utf-8) + adresy (uint32, ploché) + hodnoty (uint8)
+# Scéna je uložená řídce – jen nenulové kanály. Novější záznam stejného
+# jména přepisuje starší, DELETE záznam scénu maže. Index jméno -> pozice
+# se staví jedním průchodem při otevření.
+MAGIC = b"DMXSCN1\x00"
+RECORD = struct.Struct("<IBHHI")
+SCENE = 1
+DELETE = 2
+
+
+class SceneStore:
+    """Binární úložiště scén s indexem, náhodným přístupem a cache v paměti."""
+    _open_stores = {}
+    _open_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, filename):
+        """Sdílená instance pro daný soubor (všechny SceneManagery používají stejnou cache)."""
+        path = os.path.abspath(filename)
+        with cls._open_lock:
+            store = cls._open_stores.get(path)
+            if store is None:
+                store = cls._open_stores[path] = cls(path)
+            return store
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.index = {}      # jméno -> (offset dat, universe, počet kanálů)
+        self.cache = {}      # jméno -> snímky (universe x 512)
+        self.dead_bytes = 0
+        self._stat = None
+
+        if not os.path.exists(filename):
+            self._create(filename)
+        self._scan()
+
+    @staticmethod
+    def _create(filename):
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, "wb") as f:
+            f.write(MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _file_stat(self):
+        st = os.stat(self.filename)
+        return (st.st_size, st.st_mtime_ns)
+
+    def _scan(self):
+        """Přečte celý log a postaví index; useknutý poslední záznam odřízne."""
+        with self.lock:
+            self.index.clear()
+            self.cache.clear()
+            self.dead_bytes = 0
+            with open(self.filename, "rb") as f:
+                data = f.read()
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Soubor {self.filename} není úložiště scén.")
+
+            offset = len(MAGIC)
+            while offset + RECORD.size <= len(data):
+                crc, kind, name_len, universes, count = RECORD.unpack_from(data, offset)
+                body_start = offset + RECORD.size
+                body_end = body_start + name_len + 5 * count
+                if body_end > len(data) or zlib.crc32(data[body_start:body_end]) != crc:
+                    break
+                name = data[body_start:body_start + name_len].decode("utf-8")
+                if name in self.index:
+                    self.dead_bytes += self.index[name][3]
+                if kind == SCENE:
+                    self.index[name] = (body_start + name_len, universes, count, body_end - offset)
+                else:
+                    self.index.pop(name, None)
+                    self.dead_bytes += body_end - offset
+                offset = body_end
+
+            if offset < len(data):
+                with open(self.filename, "r+b") as f:
+                    f.truncate(offset)
+            self._stat = self._file_stat()
+
+    def _check_fresh(self):
+        # Soubor změněný jiným procesem -> index i cache jsou neplatné
+        if self._file_stat() != self._stat:
+            self._scan()
+
+    @staticmethod
+    def _record(kind, name, universes=0, channels=None, values=None):
+        name_bytes = name.encode("utf-8")
+        count = 0 if channels is None else len(channels)
+        body = name_bytes
+        if count:
+            body += channels.astype("<u4").tobytes() + values.astype(np.uint8).tobytes()
+        return RECORD.pack(zlib.crc32(body), kind, len(name_bytes), universes, count) + body
+
+    def _append(self, record):
+        with open(self.filename, "ab") as f:
+            offset = f.tell()
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self._stat = self._file_stat()
+        return offset, len(record)
+
+    def names(self):
+        with self.lock:
+            self._check_fresh()
+            return list(self.index.keys())
+
+    def __contains__(self, name):
+        with self.lock:
+            self._check_fresh()
+            return name in self.index
+
+    def save(self, name, frames):
+        """Uloží (nebo přepíše) scénu; frames = 1D universe 0 nebo 2D více universe."""
+        frames = np.atleast_2d(np.asarray(frames, dtype=np.uint8))
+        flat = frames.reshape(-1)
+        channels = np.flatnonzero(flat)
+        with self.lock:
+            self._check_fresh()
+            offset, size = self._append(self._record(SCENE, name, frames.shape[0], channels, flat[channels]))
+            if name in self.index:
+                self.dead_bytes += self.index[name][3]
+            name_len = len(name.encode("utf-8"))
+            self.index[name] = (offset + RECORD.size + name_len, frames.shape[0], len(channels), size)
+            frames = frames.copy()
+            frames.setflags(write=False)
+            self.cache[name] = frames
+
+    def load(self, name):
+        """Vrátí snímky scény (universe x 512) nebo None; opakované čtení jde z cache."""
+        with self.lock:
+            self._check_fresh()
+            frames = self.cache.get(name)
+            if frames is not None:
+                return frames
+            entry = self.index.get(name)
+            if entry is None:
+                return None
+
+            data_offset, universes, count, _ = entry
+            with open(self.filename, "rb") as f:
+                f.seek(data_offset)
+                raw = f.read(5 * count)
+            channels = np.frombuffer(raw, dtype="<u4", count=count)
+            values = np.frombuffer(raw, dtype=np.uint8, count=count, offset=4 * count)
+            frames = np.zeros((universes, DMX_UNIVERSE_SIZE), dtype=np.uint8)
+            frames.reshape(-1)[channels] = values
+            frames.setflags(write=False)
+            self.cache[name] = frames
+            return frames
+
+    def delete(self, name):
+        with self.lock:
+            self._check_fresh()
+            if name not in self.index:
+                return False
+            _, size = self._append(self._record(DELETE, name))
+            self.dead_bytes += self.index.pop(name)[3] + size
+            self.cache.pop(name, None)
+            return True
+
+    def compact(self):
+        """Přepíše log jen s platnými scénami; soubor se vymění atomicky (os.replace)."""
+        with self.lock:
+            self._check_fresh()
+            tmp = self.filename + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(MAGIC)
+                for name in list(self.index):
+                    flat = self.load(name).reshape(-1)
+                    channels = np.flatnonzero(flat)
+                    f.write(self._record(SCENE, name, self.index[name][1], channels, flat[channels]))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.filename)
+            self._scan()
+
+    def import_json(self, json_file):
+        """Převezme scény ze starého scenes.json."""
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for name, scene in data.items():
+            self.save(name, scene)
+        return list(data.keys())
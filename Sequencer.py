@@ -0,0 +1,268 @@
+import math
+import threading
+import time
+import numpy as np
+from DmxControll import COLOR_PARAMS, SCENE_FILE, NO_CHANNELS
+
+
+class TempoClock:
+    """
+    Hudební čas: pozice v beatech odvozená z BPM a času posledního beatu
+    (AudioState.bpm, AudioState.beat_time). Pozice nikdy necouvá, takže
+    doladění fáze nezpůsobí opakování kroku chase.
+    """
+    def __init__(self, bpm=120.0, beats_per_bar=4):
+        self.bpm = float(bpm)
+        self.beats_per_bar = beats_per_bar
+        self.anchor_time = None   # čas (monotonic), kdy byla pozice `anchor_beat`
+        self.anchor_beat = 0.0
+        self.last_beat = 0.0
+        self.last_sync = None
+
+    @property
+    def seconds_per_beat(self):
+        return 60.0 / self.bpm
+
+    def _position(self, now):
+        if self.anchor_time is None:
+            self.anchor_time = now
+        return self.anchor_beat + (now - self.anchor_time) / self.seconds_per_beat
+
+    def beat_at(self, now):
+        beat = max(self._position(now), self.last_beat)
+        self.last_beat = beat
+        return beat
+
+    def sync(self, bpm=None, beat_time=None, now=None):
+        """Převezme tempo a fázi z analýzy; beat v `beat_time` padne na celé číslo."""
+        if beat_time is not None and beat_time == self.last_sync:
+            beat_time = None
+        if not (bpm and bpm > 0) and beat_time is None:
+            return
+        if beat_time is None:
+            reference = time.monotonic() if now is None else now
+            position = self._position(reference)
+        else:
+            reference = beat_time
+            position = float(round(self._position(beat_time)))
+            self.last_sync = beat_time
+        if bpm and bpm > 0:
+            self.bpm = float(bpm)
+        self.anchor_time, self.anchor_beat = reference, position
+
+    def sync_state(self, state):
+        self.sync(state.bpm, state.beat_time or None)
+
+
+class Step:
+    """Předkompilovaný krok: ploché adresy, hodnoty, délka a fade v beatech."""
+    __slots__ = ("channels", "values", "beats", "fade", "curve")
+
+    def __init__(self, channels, values, beats=1.0, fade=0.0, curve="linear"):
+        self.channels = np.asarray(channels, dtype=np.intp)
+        self.values = np.broadcast_to(np.asarray(values, dtype=np.uint8), self.channels.shape).copy()
+        self.beats = beats
+        self.fade = fade
+        self.curve = curve
+
+
+class Chase:
+    """
+    Smyčka kroků v beatech. `tick` jen najde krok podle pozice
+    (searchsorted v konci kroků) a při změně kroku zapíše jeho pole
+    do vrstvy – mezi změnami nic nepočítá.
+    """
+    def __init__(self, name, steps, layer, loop=True, start_beat=0.0):
+        self.name = name
+        self.steps = list(steps)
+        self.layer = layer
+        self.loop = loop
+        self.start_beat = start_beat
+        self.ends = np.cumsum([step.beats for step in self.steps], dtype=np.float64)
+        self.length = float(self.ends[-1]) if len(self.steps) else 0.0
+        self.index = -1
+        self.finished = False
+        self.channels = (np.unique(np.concatenate([s.channels for s in self.steps]))
+                         if self.steps else NO_CHANNELS)
+
+    def tick(self, beat, clock):
+        if self.finished or beat < self.start_beat or self.length <= 0:
+            return
+        position = beat - self.start_beat
+        if self.loop:
+            position %= self.length
+        elif position >= self.length:
+            self.finished = True
+            return
+        index = int(np.searchsorted(self.ends, position, side="right"))
+        if index != self.index:
+            self.index = index
+            self.fire(self.steps[index], clock)
+
+    def fire(self, step, clock):
+        self.layer.fade_to(step.channels, step.values, step.fade * clock.seconds_per_beat, step.curve)
+
+    def release(self):
+        self.layer.release(self.channels)
+
+
+class CueList(Chase):
+    """
+    Cue list: kroky se posouvají `go()`/`back()`; krok s nenulovou délkou
+    v beatech po jejím uplynutí sám přejde na další (follow).
+    """
+    def __init__(self, name, steps, layer, start_beat=0.0):
+        super().__init__(name, steps, layer, loop=False, start_beat=start_beat)
+        self.step_start = start_beat
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def go(self):
+        with self._lock:
+            self._pending += 1
+
+    def back(self):
+        with self._lock:
+            self._pending -= 1
+
+    def tick(self, beat, clock):
+        if beat < self.start_beat or not self.steps:
+            return
+        with self._lock:
+            move, self._pending = self._pending, 0
+        if self.index < 0:
+            move = max(move, 1)
+        elif move == 0:
+            step = self.steps[self.index]
+            if step.beats and beat - self.step_start >= step.beats:
+                move = 1
+        if move == 0:
+            return
+        index = max(0, min(len(self.steps) - 1, self.index + move))
+        self.finished = index == len(self.steps) - 1
+        if index != self.index:
+            self.index = index
+            self.step_start = math.floor(beat)
+            self.fire(self.steps[index], clock)
+
+
+# Chase musí přebít vrstvy, které drží stmívače trvale (VectorClass, scény),
+# jinak by jeho "dim": 0 pod HTP nic nezhaslo; stop() kanály zase uvolní
+CHASE_PRIORITY = 10
+
+
+class Sequencer:
+    """
+    Běh chase a cue listů synchronně s hudbou. Zaregistruje se jako
+    procesor DMXControlleru, takže všechny chase posune jeden `tick`
+    na DMX snímek bez dalších vláken.
+    """
+    def __init__(self, scene_manager, layer="chase", priority=CHASE_PRIORITY, clock=None):
+        self.scene_manager = scene_manager
+        self.dmx = scene_manager.light_plot.dmx
+        self.layer = self.dmx.layer(layer, priority)
+        self.clock = clock or TempoClock()
+        self.chases = {}
+        self.lock = threading.Lock()
+        self.dmx.add_processor(self)
+
+    def sync(self, state):
+        """Tempo a fáze z AudioState (volat s každým novým stavem analýzy)."""
+        with self.lock:
+            self.clock.sync_state(state)
+
+    def compile_step(self, spec):
+        """
+        Krok ze slovníku:
+            {"scene": "test02", "beats": 2}
+            {"groups": {"midA": {"dim": 255, "color": [255, 0, 0]}}, "bars": 1, "fade": 0.5}
+        Délka je v beatech ("beats") nebo taktech ("bars"), fade v beatech.
+        """
+        beats = spec.get("beats", 1.0)
+        if "bars" in spec:
+            beats = spec["bars"] * self.clock.beats_per_bar
+
+        channels, values = [], []
+        if "scene" in spec:
+            frames = self.scene_manager.scene_store(spec.get("file", SCENE_FILE)).load(spec["scene"])
+            if frames is None:
+                raise KeyError(f"Scéna '{spec['scene']}' nebyla nalezena.")
+            self.dmx.ensure_universes(len(frames))
+            channels.append(np.arange(frames.size))
+            values.append(frames.reshape(-1))
+
+        for group_name, params in spec.get("groups", {}).items():
+            group = self.scene_manager.get_group(group_name)
+            if group is None:
+                continue
+            for param, value in params.items():
+                if param == "color":
+                    components = np.zeros(len(COLOR_PARAMS))
+                    components[:min(len(value), len(COLOR_PARAMS))] = value[:len(COLOR_PARAMS)]
+                    channels.append(group.color_channels)
+                    values.append(np.clip(group.color_weights @ components, 0, 255))
+                else:
+                    c = group.param_channels(param)
+                    channels.append(c)
+                    values.append(np.full(len(c), value))
+
+        if channels:
+            channels = np.concatenate(channels).astype(np.intp)
+            values = np.clip(np.concatenate(values), 0, 255)
+        else:
+            channels, values = NO_CHANNELS, NO_CHANNELS
+        return Step(channels, values, beats, spec.get("fade", 0.0), spec.get("curve", "linear"))
+
+    def _steps(self, steps):
+        return [step if isinstance(step, Step) else self.compile_step(step) for step in steps]
+
+    def _start_beat(self, quantize):
+        with self.lock:
+            beat = self.clock.beat_at(time.monotonic())
+        return math.ceil(beat / quantize) * quantize if quantize else beat
+
+    def start_chase(self, name, steps, loop=True, quantize=1.0):
+        """Spustí chase; začne na nejbližší hranici `quantize` beatů (1 = beat, 4 = takt)."""
+        chase = Chase(name, self._steps(steps), self.layer, loop, self._start_beat(quantize))
+        self._add(chase)
+        return chase
+
+    def start_cue_list(self, name, steps, quantize=1.0):
+        cues = CueList(name, self._steps(steps), self.layer, self._start_beat(quantize))
+        self._add(cues)
+        return cues
+
+    def _add(self, chase):
+        with self.lock:
+            old = self.chases.get(chase.name)
+            self.chases = {**self.chases, chase.name: chase}
+        if old is not None:
+            old.release()
+
+    def stop(self, name):
+        with self.lock:
+            chase = self.chases.get(name)
+            if chase is None:
+                return False
+            self.chases = {n: c for n, c in self.chases.items() if n != name}
+        chase.release()
+        return True
+
+    def stop_all(self):
+        for name in list(self.chases):
+            self.stop(name)
+
+    def is_running(self, name):
+        chase = self.chases.get(name)
+        return chase is not None and not chase.finished
+
+    def tick(self, now):
+        with self.lock:
+            beat = self.clock.beat_at(now)
+            chases = self.chases
+        for chase in chases.values():
+            chase.tick(beat, self.clock)
+
+    def close(self):
+        self.stop_all()
+        self.dmx.remove_processor(self)
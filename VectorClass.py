@@ -1,68 +1,55 @@
-import json
 import os
-from pathlib import Path
+import time
+from FeatureMapping import FeatureMapping
+from Latency import tracer
+from Metrics import registry
+from Palettes import PaletteBank
+
 
 class VectorClass:
-    def __init__(self, scene_manager, mode="newton", config_dir="VectorConfig"):
+    def __init__(self, scene_manager, mode="newton", config_dir="config",
+                 palettes_file="pozn/all_synesthetes_tone_colors.json"):
         self.scene = scene_manager
         self.mode = mode
         self.config_dir = config_dir
-        self.last_freqs = (None, None, None)
-        self._last_beat = False
+        modes_file = os.path.join(config_dir, "modes.json")
+        if not os.path.exists(modes_file):
+            raise FileNotFoundError(f"Konfigurační soubor {modes_file} neexistuje.")
+        # Všechny režimy a palety se načtou jednou; přepnutí režimu je jen index
+        self.palettes = PaletteBank.load(modes_file, palettes_file)
+        self._last_capture = 0.0
+        self.m_process = registry.histogram("vector_process_seconds", "Doba VectorClass.process_audio_state")
         self.load_mode_config(mode)
-        self.switch_state = False
 
     def load_mode_config(self, mode):
-        config_path = Path(self.config_dir) / "modes.json"
-        if not config_path.exists():
-            raise FileNotFoundError(f"Konfigurační soubor {config_path} neexistuje.")
-
-        with open(config_path, "r", encoding="utf-8") as f:
-            all_configs = json.load(f)
-
-        if mode not in all_configs:
-            raise ValueError(f"Režim '{mode}' nebyl nalezen v konfiguračním souboru.")
+        self.mode_index = self.palettes.mode(mode)
+        self.mode = mode
+        self.tone_colors = self.palettes.tones[self.mode_index]
 
-        self.config = all_configs[mode]
-        self.default_colors = self.config["default_colors"]
-        self.tone_colors = self.config["tone_colors"]
+        # Pravidla příznak -> DMX z modes.json ("rules", "on_beat"), jinak výchozí chování
+        config = self.palettes.configs[mode]
+        self.mapping = FeatureMapping(self.scene, config.get("rules"), config.get("on_beat"))
+        self.mapping.palette = self.tone_colors
 
         # Inicializace výchozích barev
-        self.scene.set_color_for_group("bass", self.default_colors.get("bass", [255, 255, 255]))
-        self.scene.set_color_for_group("midA", self.default_colors.get("midA", [255, 255, 255]))
-        self.scene.set_color_for_group("midB", self.default_colors.get("midB", [255, 255, 255]))
-        self.scene.set_color_for_group("midC", self.default_colors.get("midC", [255, 255, 255]))
+        for group in ("bass", "midA", "midB", "midC"):
+            self.scene.set_color_for_group(group, self.palettes.default_color(self.mode_index, group))
 
         # Výchozí intenzita pro každou skupinu
         self.scene.set_dim_all(128)
 
-        
+    def morph_palette(self, mode, amount):
+        """Prolne barvy tónů aktuálního režimu s jiným režimem (0 = aktuální, 1 = `mode`)."""
+        self.tone_colors = self.palettes.morph(self.mode_index, self.palettes.mode(mode), amount)
+        self.mapping.palette = self.tone_colors
 
     def process_audio_state(self, state):
-        # Reakce na beat pouze při hodnotě True
-        if state.beat_on_off:
-            self.switch_state = not self.switch_state
-            self.scene.alternating_light_strip("strip", state=self.switch_state, intensity=200)
-            self.scene.pulse_on_beat("bass", intensity=255, duration=0.2)
-            self.scene.set_dim_for_group("bass", 128)
-        
-        # Efekt: střídání ledek
-
-        
-    
-
-        # Nastavení barev podle frekvencí (pouze při změně)
-        freqs = tuple(state.freqs)
-        if len(freqs) >= 3:
-            updated = False
-            if freqs[0] != self.last_freqs[0]:
-                self.scene.set_color_for_group("bass", self.tone_colors.get(str(freqs[0]), [255, 255, 255]))
-                self.scene.set_color_for_group("midA", self.tone_colors.get(str(freqs[0]), [255, 255, 255]))
-                updated = True
-            if freqs[1] != self.last_freqs[1]:
-                self.scene.set_color_for_group("midB", self.tone_colors.get(str(freqs[1]), [255, 255, 255]))
-                updated = True
-            if freqs[2] != self.last_freqs[2]:
-                self.scene.set_color_for_group("midC", self.tone_colors.get(str(freqs[2]), [255, 255, 255]))
-                updated = True
-            self.last_freqs = freqs
\ No newline at end of file
+        start = time.perf_counter()
+        self.mapping.evaluate(state)
+        # Latence se měří jen pro první zpracování nového audia, ne pro opakovaný stav
+        capture_time = getattr(state, "capture_time", 0.0)
+        if capture_time and capture_time != self._last_capture:
+            self._last_capture = capture_time
+            tracer.since("vector", capture_time)
+            self.scene.light_plot.dmx.note_capture(capture_time)
+        self.m_process.observe(time.perf_counter() - start)
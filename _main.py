@@ -1,32 +1,45 @@
+import signal
 import time
 from AudioClass import AudioPipeline, FileSource
 from DmxControll import SceneManager, LightManager
+from Latency import tracer
+from Metrics import registry
+from Runtime import Runtime
 from VectorClass import VectorClass
 
 if __name__ == "__main__":
     dmx_frequency = 42  # Hz
-    sleep_time = 1.0 / dmx_frequency
+    runtime = Runtime.shared()
 
     # Inicializace zdrojů
     source = FileSource("Test/sound/04.wav")
     audio = AudioPipeline(source)
     manager = LightManager("light_plot.txt", dmx_frequency=dmx_frequency)
     scene = SceneManager(manager.light_plot)
-    vector = VectorClass(scene_manager=scene)
+    vector = VectorClass(scene_manager=scene.for_layer("vector"))
     scene.load_scene("test02")
+    vector_task = None
+    registry.serve()  # http://127.0.0.1:9108/metrics
+
+    # `kill -USR1 <pid>` vypíše latence od zachycení audia po DMX drát
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: tracer.dump())
 
     try:
         audio.start()
+        vector_task = runtime.every(1.0 / dmx_frequency, lambda: vector.process_audio_state(audio.state),
+                                    name="vector")
         while True:
-            time.sleep(sleep_time)
-            with audio.lock:
-                state = audio.state
-            vector.process_audio_state(state)
+            time.sleep(1.0)
 
     except KeyboardInterrupt:
         print("\nZastavuji...")
     finally:
+        runtime.cancel(vector_task)
         audio.stop()
         manager.cleanup()
         if hasattr(source, "cleanup"):
             source.cleanup()
+        runtime.stop()
+        registry.shutdown()
+        tracer.dump("latency.json")
@@ -0,0 +1,307 @@
+"""
+Přesnost a rychlost analyzátorů AudioPipeline offline nad anotovaným materiálem.
+
+    python bench/accuracy.py                               # syntetická sada
+    python bench/accuracy.py --files rec/a.wav rec/b.wav   # + nahrávky s anotací a.json, b.json
+    python bench/accuracy.py --save-baseline               # uloží základ
+    python bench/accuracy.py --baseline bench/accuracy_baseline.json
+
+Anotace nahrávky leží vedle WAV se stejným jménem a příponou .json:
+    {"bpm": 96, "beats": [0.52, 1.14, ...], "chords": [[0.0, 2.5, [0, 4, 7]], ...]}
+(akord = začátek, konec a třídy tónů 0..11).
+
+Analyzátory běží nad bloky po 100 ms v čase audia stejně jako za běhu:
+tempo každé 2 s, NMF každou 1 s nad poslední sekundou, beat na
+očekávaném čase podle AudioPipeline.advance_beat. Hlásí se F-measure
+beatů, chyba BPM včetně oktávových chyb (pravidlo `bpm /= 2`),
+přesnost akordů z DecomposeNMF a CPU čas na sekundu audia.
+
+Beat se za běhu rozhoduje přesně v očekávaném čase, takže F-measure
+beatů hodnotí hlavně mřížku tempa a její fázi. Detekce onsetů
+(beat_adjustment) se proto hodnotí zvlášť nad každým blokem proti
+anotovaným beatům (přesnost a úplnost), aby se její regrese neschovala.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "fce"), str(Path(__file__).resolve().parent)]
+
+import signals  # noqa: E402
+
+SR = signals.SR
+BEAT_WINDOW = 0.07      # tolerance beatu (s), jako mir_eval
+BEAT_SKIP = 5.0         # prvních 5 s se do F-measure nepočítá (tempo se teprve ustaluje)
+BPM_TOLERANCE = 0.04
+BASELINE_FILE = ROOT / "bench" / "accuracy_baseline.json"
+
+
+# --- metriky -----------------------------------------------------------------
+
+def beat_f_measure(reference, estimated, window=BEAT_WINDOW, skip=BEAT_SKIP):
+    """F-measure beatů s párováním jeden na jeden v toleranci `window`."""
+    reference = np.asarray([b for b in reference if b >= skip])
+    estimated = np.asarray([b for b in estimated if b >= skip])
+    if len(reference) == 0 and len(estimated) == 0:
+        return 1.0
+    if len(reference) == 0 or len(estimated) == 0:
+        return 0.0
+    used = np.zeros(len(estimated), dtype=bool)
+    hits = 0
+    for beat in reference:
+        distance = np.where(used, np.inf, np.abs(estimated - beat))
+        best = int(np.argmin(distance))
+        if distance[best] <= window:
+            used[best] = True
+            hits += 1
+    precision = hits / len(estimated)
+    recall = hits / len(reference)
+    return 0.0 if hits == 0 else 2 * precision * recall / (precision + recall)
+
+
+def onset_scores(reference, blocks, skip=BEAT_SKIP):
+    """Přesnost a úplnost beat_adjustment po blocích: onset má blok, do kterého padne anotovaný beat."""
+    reference = np.asarray(reference, dtype=np.float64)
+    hits = false_alarms = misses = 0
+    for start, end, detected in blocks:
+        if start < skip:
+            continue
+        has_beat = bool(np.any((reference >= start) & (reference < end)))
+        hits += detected and has_beat
+        false_alarms += detected and not has_beat
+        misses += has_beat and not detected
+    return {
+        "onset_precision": hits / (hits + false_alarms) if hits + false_alarms else 1.0,
+        "onset_recall": hits / (hits + misses) if hits + misses else 1.0,
+    }
+
+
+def bpm_errors(reference, estimated, tolerance=BPM_TOLERANCE):
+    """Chyba tempa: relativní chyba, shoda (acc1), shoda až na násobek (acc2), oktávová chyba."""
+    if not reference:
+        return {}
+    if not estimated:
+        return {"estimate": 0, "relative_error": 1.0, "acc1": False, "acc2": False, "octave_error": False}
+    relative = abs(estimated - reference) / reference
+    multiples = [abs(estimated * k - reference) / reference for k in (2.0, 0.5, 3.0, 1 / 3)]
+    octave = relative > tolerance and min(multiples[:2]) <= tolerance
+    return {
+        "estimate": estimated,
+        "relative_error": relative,
+        "acc1": relative <= tolerance,
+        "acc2": relative <= tolerance or min(multiples) <= tolerance,
+        "octave_error": octave,
+    }
+
+
+def chord_label(chords, start, end):
+    """Třídy tónů akordu, který pokrývá celé okno, jinak None (okno přes změnu akordu)."""
+    for c_start, c_end, pitch_classes in chords:
+        if c_start <= start and end <= c_end:
+            return set(pitch_classes)
+    return None
+
+
+def notes_to_pitch_classes(notes):
+    # DecomposeNMF vrací tóny 1..12 (midi % 12 + 1) a kód akordu na konci
+    return {(int(n) - 1) % 12 for n in notes[:-1]}
+
+
+# --- offline běh analyzátorů -------------------------------------------------------
+
+class OfflineRun:
+    """Analyzátory jedné AudioPipeline přehrané v čase audia, s CPU časem na analyzátor."""
+    def __init__(self, signal):
+        from AudioClass import AudioPipeline
+        self.pipeline = AudioPipeline(source=None, rate=SR)
+        self.signal = signals.to_int16(signal) if signal.dtype != np.int16 else signal
+        self.cpu = {"beat": 0.0, "bpm": 0.0, "nmf": 0.0}
+        self.beats = []
+        self.bpms = []
+        self.notes = []   # (začátek, konec, notes)
+        self.onsets = []  # (začátek, konec, beat_adjustment bloku)
+
+    def _timed(self, name, fn, *args):
+        start = time.process_time()
+        result = fn(*args)
+        self.cpu[name] += time.process_time() - start
+        return result
+
+    def run(self):
+        p = self.pipeline
+        block = p.buffer_size / SR
+        next_bpm, next_nmf = 2.0, 1.0
+        beating = False
+        for i, chunk in enumerate(np.array_split(self.signal, max(1, len(self.signal) // p.buffer_size))):
+            now = (i + 1) * block
+            p.ring.write(chunk, now)
+
+            # Detekce onsetů na každém bloku, nezávisle na mřížce tempa
+            p.calculate_rms(chunk)
+            self.onsets.append((now - block, now, bool(p.beat_adjustment(chunk))))
+
+            # Beaty očekávané do příštího bloku vidí tento (nejčerstvější) blok
+            while beating and p.state.bpm > 0 and p.last_beat_time + 60.0 / p.state.bpm < now + block:
+                expected = p.last_beat_time + 60.0 / p.state.bpm
+                buffer = p.beat_reader.latest()
+                self.beats.append(self._timed("beat", p.advance_beat, expected, expected, buffer))
+
+            if now >= next_bpm:
+                next_bpm += 2.0
+                self._timed("bpm", p.calculate_bpm)
+                if p.bpm_ready_event.is_set():
+                    self.bpms.append(p.state.bpm)
+                    if not beating:
+                        beating = True
+                        p.last_beat_time = now
+
+            if now >= next_nmf:
+                next_nmf += 1.0
+                data = p.recent(SR)
+                if len(data) >= SR:
+                    notes = self._timed("nmf", p.nmf_analyzer.analyze_buffer, data)
+                    if len(notes) >= 3:
+                        self.notes.append((now - 1.0, now, list(notes)))
+        return self
+
+
+def evaluate(name, signal, annotation):
+    seconds = len(signal) / SR
+    run = OfflineRun(signal).run()
+    result = {"seconds": seconds}
+
+    if annotation.get("beats") is not None:
+        result["beat_f_measure"] = beat_f_measure(annotation["beats"], run.beats)
+        result.update(onset_scores(annotation["beats"], run.onsets))
+    if annotation.get("bpm"):
+        final = run.bpms[-1] if run.bpms else 0
+        result.update({f"bpm_{k}": v for k, v in bpm_errors(annotation["bpm"], final).items()})
+
+    windows = [(chord_label(annotation.get("chords", []), s, e), notes_to_pitch_classes(n))
+               for s, e, n in run.notes]
+    windows = [(ref, est) for ref, est in windows if ref is not None]
+    if windows:
+        result["chord_accuracy"] = float(np.mean([ref == est for ref, est in windows]))
+        result["pitch_class_recall"] = float(np.mean([len(ref & est) / len(ref) for ref, est in windows]))
+
+    result["cpu_per_audio_second"] = {k: v / seconds for k, v in run.cpu.items()}
+    result["cpu_per_audio_second"]["total"] = sum(run.cpu.values()) / seconds
+    print(f"{name:<22} F {result.get('beat_f_measure', float('nan')):.3f}  "
+          f"onset P {result.get('onset_precision', float('nan')):.2f} "
+          f"R {result.get('onset_recall', float('nan')):.2f}  "
+          f"BPM {result.get('bpm_estimate', '-')!s:>4} (ref {annotation.get('bpm', '-')})  "
+          f"akordy {result.get('chord_accuracy', float('nan')):.2f}  "
+          f"CPU {result['cpu_per_audio_second']['total'] * 1000:.1f} ms/s")
+    return result
+
+
+# --- materiál ---------------------------------------------------------------------
+
+def synthetic_corpus(seconds=30.0):
+    """Anotovaná syntetická sada; 120 a 140 BPM zkouší oktávovou chybu z `bpm /= 2`."""
+    for bpm in (80, 96, 120, 140):
+        yield f"song_{bpm}", *signals.song(seconds, bpm)
+    signal, annotation = signals.song(seconds, 96, noise_level=0.3, seed=1)
+    yield "song_96_noisy", signal, annotation
+    clicks, beats = signals.click_track(110, seconds, jitter=0.01, seed=2)
+    yield "clicks_110_jitter", clicks, {"bpm": 110, "beats": beats.tolist()}
+    harmony, chords = signals.chord_progression(signals.PROGRESSION * 2, 2.0)
+    yield "chords", harmony, {"chords": chords}
+    yield "pink_noise", signals.noise(seconds, color="pink"), {"beats": []}
+
+
+def recorded(path):
+    import librosa
+    path = Path(path)
+    with open(path.with_suffix(".json"), "r", encoding="utf-8") as f:
+        annotation = json.load(f)
+    signal, _ = librosa.load(str(path), sr=SR, mono=True)
+    return path.stem, signal, annotation
+
+
+def summarize(items):
+    def mean(key):
+        values = [item[key] for item in items.values() if key in item]
+        return float(np.mean(values)) if values else None
+
+    with_bpm = [item for item in items.values() if "bpm_acc1" in item]
+    return {
+        "beat_f_measure": mean("beat_f_measure"),
+        "onset_precision": mean("onset_precision"),
+        "onset_recall": mean("onset_recall"),
+        "bpm_acc1": float(np.mean([i["bpm_acc1"] for i in with_bpm])) if with_bpm else None,
+        "bpm_acc2": float(np.mean([i["bpm_acc2"] for i in with_bpm])) if with_bpm else None,
+        "bpm_octave_errors": sum(bool(i["bpm_octave_error"]) for i in with_bpm),
+        "chord_accuracy": mean("chord_accuracy"),
+        "pitch_class_recall": mean("pitch_class_recall"),
+        "cpu_per_audio_second": float(np.mean([i["cpu_per_audio_second"]["total"] for i in items.values()])),
+    }
+
+
+# Metriky, u kterých je vyšší lepší; pokles o víc než tolerance je regrese
+ACCURACY_KEYS = ("beat_f_measure", "onset_precision", "onset_recall", "bpm_acc1", "bpm_acc2", "chord_accuracy", "pitch_class_recall")
+
+
+def compare(summary, baseline, tolerance=0.02, cpu_ratio=1.2):
+    """Vypíše změny proti základu; vrací seznam regresí."""
+    regressions = []
+    print(f"\n{'metrika':<24}{'základ':>10}{'teď':>10}")
+    for key in ACCURACY_KEYS + ("bpm_octave_errors", "cpu_per_audio_second"):
+        base, now = baseline.get(key), summary.get(key)
+        if base is None or now is None:
+            continue
+        worse = ((key in ACCURACY_KEYS and now < base - tolerance)
+                 or (key == "bpm_octave_errors" and now > base)
+                 or (key == "cpu_per_audio_second" and now > base * cpu_ratio))
+        print(f"{key:<24}{base:>10.3f}{now:>10.3f}{'  HORŠÍ' if worse else ''}")
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Přesnost a rychlost beat/BPM/akordů")
+    parser.add_argument("--files", nargs="*", default=[], help="nahrávky WAV s anotací <jméno>.json")
+    parser.add_argument("--seconds", type=float, default=30.0, help="délka syntetických skladeb")
+    parser.add_argument("--no-synthetic", action="store_true")
+    parser.add_argument("--out", help="uloží celý výsledek jako JSON")
+    parser.add_argument("--baseline", help="porovná se základem (výchozí bench/accuracy_baseline.json)",
+                        nargs="?", const=str(BASELINE_FILE))
+    parser.add_argument("--save-baseline", action="store_true", help="uloží souhrn jako nový základ")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="povolený pokles přesnosti")
+    args = parser.parse_args(argv)
+
+    try:
+        import AudioClass  # noqa: F401
+    except ImportError as e:
+        print(f"Analyzátory nelze spustit, chybí závislost: {e.name or e}")
+        return 2
+
+    corpus = [] if args.no_synthetic else list(synthetic_corpus(args.seconds))
+    corpus += [recorded(path) for path in args.files]
+    items = {name: evaluate(name, signal, annotation) for name, signal, annotation in corpus}
+    summary = summarize(items)
+    report = {"summary": summary, "items": items}
+    print(json.dumps(summary, indent=4))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+        print(f"Základ uložen do {BASELINE_FILE}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
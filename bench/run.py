@@ -0,0 +1,289 @@
+"""
+Benchmarky horkých cest DSP a DMX nad syntetickými signály.
+
+    python bench/run.py                          # vše, výsledky do bench/results/
+    python bench/run.py --only fade frame        # jen vybrané (podřetězec jména)
+    python bench/run.py --compare bench/results/baseline.json
+
+Výsledek je JSON s údaji o stroji a verzi (git commit) a pro každý
+benchmark časy volání (min/průměr/p50/p95 v µs) a u audio kroků
+i násobek reálného času. Benchmark, kterému chybí závislost
+(librosa, scipy...), se zapíše jako přeskočený s důvodem.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "fce"), str(Path(__file__).resolve().parent)]
+
+import signals  # noqa: E402
+
+SR = signals.SR
+RESULTS_DIR = ROOT / "bench" / "results"
+BENCHMARKS = []
+
+
+def benchmark(name, audio_seconds=None, number=1):
+    """
+    Registruje benchmark. Funkce připraví data a vrátí volání, které se
+    měří; `audio_seconds` je délka audia zpracovaného jedním voláním.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup, audio_seconds, number))
+        return setup
+    return register
+
+
+def measure(fn, number=1, repeat=20, warmup=2, min_time=0.0):
+    for _ in range(warmup):
+        fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return np.array(times)
+
+
+# --- DSP --------------------------------------------------------------------
+
+@benchmark("filter_bp_1s", audio_seconds=1.0)
+def bench_filter():
+    import filter as flt
+    signal = signals.to_int16(signals.click_track(120, 1.0)[0])
+    return lambda: flt.create_filter(signal, "BP", SR, 20, 200, 2)
+
+
+def _pipeline():
+    from AudioClass import AudioPipeline
+    return AudioPipeline(source=None, rate=SR)
+
+
+@benchmark("beat_adjustment_100ms", audio_seconds=0.1)
+def bench_beat_adjustment():
+    pipeline = _pipeline()
+    block = signals.to_int16(signals.click_track(120, 0.1)[0])
+    pipeline.calculate_rms(block)
+    return lambda: pipeline.beat_adjustment(block)
+
+
+@benchmark("calculate_bpm_4s", audio_seconds=4.0)
+def bench_calculate_bpm():
+    pipeline = _pipeline()
+    signal = signals.to_int16(signals.click_track(96, 4.0)[0])
+    for block in np.array_split(signal, 40):
+        pipeline.ring.write(block)
+    return pipeline.calculate_bpm
+
+
+@benchmark("block_ring_long_file", audio_seconds=600.0)
+def bench_ring():
+    from AudioRing import BlockRing
+    blocks = np.array_split(signals.to_int16(signals.long_file(10.0)[0]), 6000)
+
+    def step():
+        # Vstup po 100 ms blocích, beat čte nejčerstvější, okno 1 s každých 10 bloků
+        ring = BlockRing(capacity=64)
+        reader = ring.reader("beat")
+        for i, block in enumerate(blocks):
+            ring.write(block)
+            reader.latest()
+            if i % 10 == 0:
+                ring.window(SR)
+    return step
+
+
+@benchmark("nmf_analyze_buffer_1s", audio_seconds=1.0)
+def bench_nmf():
+    from RealtimeNMF import DecomposeNMF
+    nmf = DecomposeNMF(sr=SR, n_components=5, n_fft=4096)
+    signal = signals.to_int16(signals.chord((60, 64, 67), 1.0))
+    return lambda: nmf.analyze_buffer(signal)
+
+
+# --- DMX --------------------------------------------------------------------
+
+def _rig():
+    from DmxControll import DMXController, LightPlot, SceneManager
+    dmx = DMXController()
+    plot = LightPlot(str(ROOT / "config" / "light_plot.txt"), dmx)
+    return dmx, SceneManager(plot)
+
+
+def _states(count=64, seed=0):
+    from types import SimpleNamespace
+    rng = np.random.default_rng(seed)
+    return [SimpleNamespace(rms=1000.0, db=float(rng.uniform(-40, 0)), bpm=120,
+                            beat_on_off=bool(i % 8 == 0), beat_time=float(i // 8),
+                            freqs=tuple(int(x) for x in rng.integers(1, 13, 3)),
+                            chord=str(int(rng.integers(1, 13))), capture_time=0.0)
+            for i in range(count)]
+
+
+@benchmark("vector_process_audio_state")
+def bench_vector():
+    from VectorClass import VectorClass
+    dmx, scene = _rig()
+    vector = VectorClass(scene.for_layer("vector"), config_dir=str(ROOT / "config"),
+                         palettes_file=str(ROOT / "pozn" / "all_synesthetes_tone_colors.json"))
+    states = _states()
+    index = [0]
+
+    def step():
+        vector.process_audio_state(states[index[0] % len(states)])
+        index[0] += 1
+    return step
+
+
+@benchmark("fade_advance_8_universes")
+def bench_fades():
+    from DmxLayers import Layer
+    size = 8 * 512
+    layer = Layer("bench", size)
+    channels = np.arange(size)
+    rng = np.random.default_rng(0)
+
+    def step():
+        # Každý snímek nový přechod na čtvrtině kanálů, zbytek dobíhá; fade_to
+        # razítkuje přechody time.monotonic(), takže advance musí běžet na stejných
+        # hodinách, jinak by každý přechod skončil hned při prvním advance
+        chosen = channels[rng.random(size) < 0.25]
+        layer.fade_to(chosen, rng.integers(0, 256, len(chosen)), duration=0.5)
+        layer.advance(time.monotonic())
+    return step
+
+
+@benchmark("frame_build_artnet")
+def bench_frame():
+    from DmxOutput import ArtNetOutput
+    dmx, scene = _rig()
+    scene.set_dim_all(200)
+    output = ArtNetOutput(host="127.0.0.1")
+    sequence = [0]
+
+    def step():
+        dmx.render()
+        frames = dmx.snapshot()
+        sequence[0] = sequence[0] % 255 + 1
+        for universe in range(dmx.universes):
+            output.build_packet(universe, frames[universe].tobytes(), sequence[0])
+    return step
+
+
+# --- běh a porovnání ----------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def summarize(times, audio_seconds):
+    us = times * 1e6
+    result = {
+        "runs": len(times),
+        "min_us": float(us.min()),
+        "mean_us": float(us.mean()),
+        "p50_us": float(np.percentile(us, 50)),
+        "p95_us": float(np.percentile(us, 95)),
+        "calls_per_s": float(1.0 / times.mean()),
+    }
+    if audio_seconds:
+        result["realtime_factor"] = float(audio_seconds / times.mean())
+    return result
+
+
+def run(only=None, repeat=20, min_time=0.5):
+    results = {}
+    for name, setup, audio_seconds, number in BENCHMARKS:
+        if only and not any(pattern in name for pattern in only):
+            continue
+        try:
+            fn = setup()
+        except ImportError as e:
+            results[name] = {"skipped": f"chybí závislost: {e.name or e}"}
+            print(f"{name:<30} přeskočeno ({results[name]['skipped']})")
+            continue
+        results[name] = summarize(measure(fn, number, repeat, min_time=min_time), audio_seconds)
+        r = results[name]
+        extra = f"  {r['realtime_factor']:.0f}x realtime" if "realtime_factor" in r else ""
+        print(f"{name:<30} p50 {r['p50_us']:>10.1f} µs  p95 {r['p95_us']:>10.1f} µs{extra}")
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=1.2):
+    """Vypíše poměr p50 proti základu; vrací jména benchmarků zpomalených nad práh."""
+    slower = []
+    print(f"\n{'benchmark':<30}{'základ µs':>12}{'teď µs':>12}{'poměr':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base or "p50_us" not in base or "p50_us" not in result:
+            continue
+        ratio = result["p50_us"] / base["p50_us"]
+        flag = "  POMALEJŠÍ" if ratio > threshold else ""
+        print(f"{name:<30}{base['p50_us']:>12.1f}{result['p50_us']:>12.1f}{ratio:>8.2f}{flag}")
+        if ratio > threshold:
+            slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarky DSP a DMX")
+    parser.add_argument("--only", nargs="*", help="jen benchmarky obsahující tyto podřetězce")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimální doba měření na benchmark (s)")
+    parser.add_argument("--out", help="soubor výsledků (výchozí bench/results/<stroj>-<commit>.json)")
+    parser.add_argument("--compare", help="JSON se základem pro porovnání")
+    parser.add_argument("--threshold", type=float, default=1.2, help="poměr p50, nad kterým je to regrese")
+    parser.add_argument("--write-signals", metavar="DIR", help="uloží testovací signály jako WAV a skončí")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    if args.write_signals:
+        out = Path(args.write_signals)
+        out.mkdir(parents=True, exist_ok=True)
+        signals.write_wav(out / "clicks_120.wav", signals.click_track(120, 30.0)[0])
+        signals.write_wav(out / "chords.wav", signals.chord_progression(signals.PROGRESSION)[0])
+        signals.write_wav(out / "pink_noise.wav", signals.noise(30.0, color="pink"))
+        signals.write_wav(out / "song_long.wav", signals.long_file(10.0)[0])
+        print(f"Signály uloženy do {out}")
+        return 0
+
+    report = run(args.only, args.repeat, args.min_time)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{report['meta']['node']}-{report['meta']['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Výsledky uloženy do {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            slower = compare(report, json.load(f), args.threshold)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import wave
+import numpy as np
+
+
+SR = 44100
+
+
+def midi_to_hz(note):
+    return 440.0 * 2.0 ** ((note - 69) / 12.0)
+
+
+def _envelope(length, decay):
+    return np.exp(-np.arange(length) / decay)
+
+
+def click_track(bpm=120, seconds=10.0, sr=SR, accent=4, jitter=0.0, seed=0):
+    """
+    Kopák (60 Hz, pokles ~80 ms) a klik (2 kHz) na každou dobu, první doba
+    taktu hlasitější. Vrací (signál float32, časy dob v s).
+    `jitter` je směrodatná odchylka časování dob v sekundách.
+    """
+    rng = np.random.default_rng(seed)
+    signal = np.zeros(int(seconds * sr), dtype=np.float32)
+    beats = np.arange(0.0, seconds, 60.0 / bpm)
+    if jitter:
+        beats = np.clip(beats + rng.normal(0.0, jitter, len(beats)), 0.0, seconds)
+
+    kick_len = int(0.15 * sr)
+    t = np.arange(kick_len) / sr
+    kick = (np.sin(2 * np.pi * 60 * t) * _envelope(kick_len, 0.08 * sr / 3)).astype(np.float32)
+    click_len = int(0.01 * sr)
+    t = np.arange(click_len) / sr
+    click = (0.3 * np.sin(2 * np.pi * 2000 * t) * _envelope(click_len, 0.002 * sr)).astype(np.float32)
+
+    for i, beat in enumerate(beats):
+        start = int(beat * sr)
+        gain = 1.0 if accent and i % accent == 0 else 0.6
+        end = min(start + kick_len, len(signal))
+        signal[start:end] += gain * kick[:end - start]
+        end = min(start + click_len, len(signal))
+        signal[start:end] += gain * click[:end - start]
+    return signal, beats
+
+
+def chord(notes=(60, 64, 67), seconds=2.0, sr=SR, harmonics=4):
+    """Tóny akordu (midi) s harmonickými a měkkým náběhem/doběhem."""
+    t = np.arange(int(seconds * sr)) / sr
+    signal = np.zeros(len(t), dtype=np.float32)
+    for note in notes:
+        f0 = midi_to_hz(note)
+        for h in range(1, harmonics + 1):
+            signal += (np.sin(2 * np.pi * f0 * h * t) / h).astype(np.float32)
+    fade = min(int(0.02 * sr), len(t) // 2)
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+    signal[:fade] *= ramp
+    signal[len(t) - fade:] *= ramp[::-1]
+    return signal / max(1e-9, np.max(np.abs(signal)))
+
+
+def chord_progression(chords, seconds_each=2.0, sr=SR):
+    """Sled akordů; vrací (signál, [(začátek, konec, třídy tónů 0..11)])."""
+    parts, labels = [], []
+    for i, notes in enumerate(chords):
+        parts.append(chord(notes, seconds_each, sr))
+        labels.append((i * seconds_each, (i + 1) * seconds_each, sorted({n % 12 for n in notes})))
+    return np.concatenate(parts), labels
+
+
+def noise(seconds=5.0, sr=SR, color="white", seed=0):
+    """Bílý nebo růžový (1/f) šum, špička 1."""
+    rng = np.random.default_rng(seed)
+    white = rng.standard_normal(int(seconds * sr))
+    if color == "pink":
+        spectrum = np.fft.rfft(white)
+        spectrum /= np.sqrt(np.maximum(np.arange(len(spectrum)), 1))
+        white = np.fft.irfft(spectrum, len(white))
+    elif color != "white":
+        raise ValueError(f"Neznámá barva šumu '{color}'.")
+    return (white / np.max(np.abs(white))).astype(np.float32)
+
+
+def mix(*parts):
+    """Sečte signály (kratší se doplní nulami) a normalizuje na 0.9."""
+    length = max(len(part) for part in parts)
+    out = np.zeros(length, dtype=np.float32)
+    for part in parts:
+        out[:len(part)] += part
+    return 0.9 * out / max(1e-9, np.max(np.abs(out)))
+
+
+# I - V - vi - IV v C dur
+PROGRESSION = [(60, 64, 67), (67, 71, 74), (69, 72, 76), (65, 69, 72)]
+
+
+def song(seconds=30.0, bpm=96, sr=SR, noise_level=0.05, seed=0):
+    """
+    Syntetická skladba: kopák na doby, akordy po taktech a šum.
+    Vrací (signál, anotace {"bpm", "beats", "chords"}).
+    """
+    beat_signal, beats = click_track(bpm, seconds, sr, seed=seed)
+    bar = 4 * 60.0 / bpm
+    count = int(np.ceil(seconds / bar))
+    chords = [PROGRESSION[i % len(PROGRESSION)] for i in range(count)]
+    harmony, labels = chord_progression(chords, bar, sr)
+    signal = mix(beat_signal, 0.4 * harmony[:len(beat_signal)],
+                 noise_level * noise(seconds, sr, "pink", seed))
+    labels = [(start, min(end, seconds), pcs) for start, end, pcs in labels if start < seconds]
+    return signal, {"bpm": bpm, "beats": beats.tolist(), "chords": labels}
+
+
+def long_file(minutes=10.0, bpm=96, sr=SR):
+    """Dlouhá skladba pro testy paměti a ustálené rychlosti."""
+    return song(minutes * 60.0, bpm, sr)
+
+
+def to_int16(signal):
+    return np.int16(np.clip(signal, -1.0, 1.0) * 32767)
+
+
+def write_wav(path, signal, sr=SR):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes(to_int16(signal).tobytes())
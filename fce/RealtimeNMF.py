@@ -8,6 +8,8 @@ from sklearn.decomposition import NMF
 import json
 from pathlib import Path
 from collections import Counter
+import time
+from Metrics import registry
 
 class NMFPlotter:
     def __init__(self, stft, activations, bases, sr, n_fft, highlighted_ranges):
@@ -101,6 +103,7 @@ class DecomposeNMF:
         self.activations = None
         self.highlighted_ranges = []
         self.normalized_components = []
+        self.analyze_seconds = registry.histogram("nmf_analyze_seconds", "Doba DecomposeNMF.analyze_buffer")
 
     def hz_to_note_name(self, hz):
         return librosa.hz_to_note(hz)
@@ -248,6 +251,7 @@ class DecomposeNMF:
         self.notes = sorted_notes + [chord_code]
 
     def analyze_buffer(self, signal, normalize=True):
+        start = time.perf_counter()
         if signal.dtype == np.int16:
             signal = signal.astype(np.float32) / 32768.0
 
@@ -284,6 +288,7 @@ class DecomposeNMF:
                 for i in range(self.n_components)
             ]
 
+        self.analyze_seconds.observe(time.perf_counter() - start)
         return self.notes
 
 def main():
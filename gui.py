@@ -1,6 +1,4 @@
 import sys
-import time
-import threading
 import numpy as np
 from PySide6.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QFileDialog,
@@ -12,6 +10,10 @@ from PySide6.QtGui import QFont, QPalette, QColor, QPainter, QLinearGradient, QM
 
 from AudioClass import AudioPipeline, FileSource
 from DmxControll import SceneManager, LightManager, SimulatorManager, Head
+from Effects import EFFECT_PRIORITY, EffectEngine
+from Movement import MovementEngine
+from Runtime import Runtime
+from Sequencer import Sequencer, Step
 from VectorClass import VectorClass
 
 class SimpleColorPicker(QFrame):
@@ -50,7 +52,7 @@ class WaveformPreview(QLabel):
 
     def update_waveform(self):
         with self.audio.lock:
-            signal = self.audio.recent_signal[-2048:]
+            signal = self.audio.recent(2048)
         if len(signal) == 0:
             return
 
@@ -108,10 +110,13 @@ class LightControlGUI(QWidget):
         try:
             self.manager = LightManager("light_plot.txt", dmx_frequency=42)
         except RuntimeError:
-            self.manager = SimulatorManager("light_plot.txt", dmx_frequency=2)
+            self.manager = SimulatorManager("light_plot.txt", dmx_frequency=42)
 
-        self.scene = SceneManager(self.manager.light_plot)
-        self.vector = VectorClass(scene_manager=self.scene)
+        self.scene = SceneManager(self.manager.light_plot, layer="gui")
+        self.vector = VectorClass(scene_manager=self.scene.for_layer("vector"))
+        self.sequencer = Sequencer(self.scene)
+        self.effects = EffectEngine(self.scene, priority=EFFECT_PRIORITY, clock=self.sequencer.clock)
+        self.movement = MovementEngine(self.scene, clock=self.sequencer.clock)
         self.selected_color = QColor(255, 255, 255)
 
         self.start_button = QPushButton("▶ Start")
@@ -188,6 +193,7 @@ class LightControlGUI(QWidget):
         right_panel.addStretch()
 
         self.master_fader = FaderBlock("Master", self.set_dimmer)
+        self.master_fader.slider.setValue(255)
         self.strobo_fader = FaderBlock("Strobo")
         self.fade_fader = FaderBlock("Fade")
 
@@ -242,74 +248,63 @@ class LightControlGUI(QWidget):
         self.scene.blackout()
 
     def run_on_drums(self):
-        self.scene.set_movement_for_group("midB", pan=60, tilt=220)
+        self.movement.move_to("midB", pan=60, tilt=220)
 
     def run_on_musician(self):
-        self.scene.set_movement_for_group("midB", pan=120, tilt=100)
+        self.movement.move_to("midB", pan=120, tilt=100)
 
-    def run_shuffle(self):
-        threading.Thread(target=self._shuffle_lights, daemon=True).start()
+    def toggle_chase(self, name, steps, loop=True):
+        if self.sequencer.is_running(name):
+            self.sequencer.stop(name)
+        else:
+            self.sequencer.start_chase(name, steps, loop=loop)
 
-    def _shuffle_lights(self):
-        mids = ["midA", "midB", "midC"]
-        while self.running:
-            for group in mids:
-                self.scene.set_dim_for_group(group, 255)
-                time.sleep(0.3)
-                self.scene.set_dim_for_group(group, 0)
-                time.sleep(0.1)
+    def run_shuffle(self):
+        # Každá skupina 3/4 beatu svítí, 1/4 beatu zhasnutá
+        steps = []
+        for group in ["midA", "midB", "midC"]:
+            steps.append({"groups": {group: {"dim": 255}}, "beats": 0.75})
+            steps.append({"groups": {group: {"dim": 0}}, "beats": 0.25})
+        self.toggle_chase("shuffle", steps)
 
     def run_shuffle_group(self):
-        threading.Thread(target=self._shuffle_groups, daemon=True).start()
-
-    def _shuffle_groups(self):
-        groups = ["midA", "midB", "midC"]
-        while self.running:
-            for group in groups:
-                self.scene.set_dim_all(0)
-                self.scene.set_dim_for_group(group, 255)
-                time.sleep(0.5)
+        groups = self.scene.groups.names()
+        steps = [{"groups": {other: {"dim": 255 if other == group else 0} for other in groups}, "beats": 1}
+                 for group in ["midA", "midB", "midC"]]
+        self.toggle_chase("shuffle_group", steps)
 
     def toggle_hazer(self):
-        threading.Thread(target=self._hazer_pulse, daemon=True).start()
+        self._set_haze(255)
+        Runtime.shared().after(2, lambda: self._set_haze(0), name="hazer")
         
     def set_dimmer(self, value):
-        self.scene.set_dim_all(value)
+        self.scene.set_grand_master(value / 255)
 
 
-    def _hazer_pulse(self):
+    def _set_haze(self, value):
         for light in self.scene.get_group_lights("special"):
             if hasattr(light, "set_haze"):
-                light.set_haze(255)
-        time.sleep(2)
-        for light in self.scene.get_group_lights("special"):
-            if hasattr(light, "set_haze"):
-                light.set_haze(0)
+                light.set_haze(value, self.scene.layer)
 
     def run_wave_effect(self):
-        threading.Thread(target=self._wave_effect, daemon=True).start()
-
-    def _wave_effect(self):
-        mids = self.scene.get_group_lights("mid")
-        for light in mids:
-            if hasattr(light, 'set_dim'):
-                light.set_dim(255)
-                time.sleep(0.2)
-                light.set_dim(0)
+        # Jedno proběhnutí vlny přes stmívače mid skupin, půl beatu na světlo
+        dims = np.concatenate([self.scene._param_channels(g, "dim") for g in ("midA", "midB", "midC")])
+        steps = [Step(dims, np.where(np.arange(len(dims)) == i, 255, 0), beats=0.5) for i in range(len(dims))]
+        steps.append(Step(dims, 0, beats=0.5))
+        self.toggle_chase("wave", steps, loop=False)
 
     def update_light_movement(self):
         index = self.light_selector.currentIndex()
         if index >= 0:
             light = self.head_lights[index]
-            if hasattr(light, "set_position"):
-                light.set_position(self.pan_slider.value(), self.tilt_slider.value())
+            self.movement.move_light(light, self.pan_slider.value(), self.tilt_slider.value())
 
     def update_light_zoom(self):
         index = self.light_selector.currentIndex()
         if index >= 0:
             light = self.head_lights[index]
             if hasattr(light, "set_zoom"):
-                light.set_zoom(self.zoom_slider.value())
+                light.set_zoom(self.zoom_slider.value(), self.scene.layer)
 
     def select_file(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Vyber zvukový soubor", ".", "WAV Files (*.wav)")
@@ -320,7 +315,7 @@ class LightControlGUI(QWidget):
             self.audio_file = filename
             self.source = FileSource(self.audio_file)
             self.audio = AudioPipeline(self.source)
-            self.vector = VectorClass(scene_manager=self.scene)
+            self.vector = VectorClass(scene_manager=self.scene.for_layer("vector"))
             self.audio_preview.audio = self.audio
             self.running = False
 
@@ -332,12 +327,16 @@ class LightControlGUI(QWidget):
     def stop_audio(self):
         if self.running:
             self.audio.stop()
+            self.sequencer.stop_all()
+            self.effects.clear()
             self.running = False
 
     def update_audio_state(self):
         with self.audio.lock:
             state = self.audio.state
         self.vector.process_audio_state(state)
+        self.sequencer.sync(state)
+        self.effects.update_from_state(state)
         self.audio_preview.update_waveform()
         self.state_label.setText(
             f"AudioState:\nBeat: {state.beat_on_off} | Tóny: {state.freqs} | Akord: {state.chord}"
@@ -347,7 +346,9 @@ def run_gui():
     app = QApplication(sys.argv)
     window = LightControlGUI()
     window.show()
-    sys.exit(app.exec())
+    code = app.exec()
+    Runtime.shared().stop()
+    sys.exit(code)
 
 if __name__ == "__main__":
     run_gui()
\ No newline at end of file